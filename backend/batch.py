@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import time
+import zipfile
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Sequence
+import logging
+from pipeline import WORKBOOK_SUFFIXES, process_workbook, run_stage
+from processed_data import ProcessedWorkbook, combine_workbooks
+from result_cache import ResultCache
+from upload_stream import save_upload, UploadTooLargeError, UPLOAD_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIX = '.zip'
+
+
+class BatchError(Exception):
+    """Raised for a batch that cannot be processed: wrong file types, too many files, a broken archive"""
+
+
+class BatchFile(NamedTuple):
+    """One workbook of a batch, saved under ``path``"""
+    filename: str  # as uploaded, or its name inside the zip archive
+    path: Path
+    content_hash: str
+    size: int
+
+
+async def save_batch(files: Sequence[Any], upload_dir: Path, batch_id: str, max_file_bytes: int,
+                     max_files: int, max_bytes: int) -> List[BatchFile]:
+    """Save uploaded workbooks, and the workbooks inside uploaded zip archives, to ``upload_dir``
+
+    Each workbook may have up to ``max_file_bytes``; the batch up to
+    ``max_files`` workbooks and ``max_bytes`` in total. Nothing is left on
+    disk when the batch is refused.
+    """
+    saved: List[BatchFile] = []
+    total = 0
+    try:
+        for file in files:
+            if file.filename.endswith(ARCHIVE_SUFFIX):
+                archive_path = upload_dir / f"{batch_id}_{len(saved)}{ARCHIVE_SUFFIX}"
+                try:
+                    await save_upload(file, archive_path, max_bytes - total)
+                    # Decompressing is blocking work; keep it off the event loop
+                    loop = asyncio.get_running_loop()
+                    extracted = await loop.run_in_executor(
+                        None, extract_workbooks, archive_path, upload_dir, batch_id, len(saved),
+                        max_file_bytes, max_files - len(saved), max_bytes - total
+                    )
+                finally:
+                    if archive_path.exists():
+                        archive_path.unlink()
+                saved.extend(extracted)
+                total += sum(workbook.size for workbook in extracted)
+            elif file.filename.endswith(WORKBOOK_SUFFIXES):
+                if len(saved) >= max_files:
+                    raise BatchError(f"A batch holds at most {max_files} workbooks")
+                path = upload_dir / f"{batch_id}_{len(saved)}{Path(file.filename).suffix}"
+                upload = await save_upload(file, path, min(max_file_bytes, max_bytes - total))
+                saved.append(BatchFile(file.filename, path, upload.content_hash, upload.size))
+                total += upload.size
+            else:
+                raise BatchError(f"Only Excel files (.xlsx, .xls) and zip archives are allowed: {file.filename}")
+    except BaseException:
+        for workbook in saved:
+            if workbook.path.exists():
+                workbook.path.unlink()
+        raise
+
+    if not saved:
+        raise BatchError("The batch holds no Excel files")
+    return saved
+
+
+def extract_workbooks(archive_path: Path, upload_dir: Path, batch_id: str, start: int,
+                      max_file_bytes: int, max_files: int, max_bytes: int) -> List[BatchFile]:
+    """Unpack the Excel files of a zip archive, numbered from ``start``; other members are skipped
+
+    Sizes are counted while decompressing rather than trusted from the
+    archive's directory.
+    """
+    extracted: List[BatchFile] = []
+    total = 0
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                name = member.filename
+                if member.is_dir() or name.startswith('__MACOSX/') or Path(name).name.startswith('.'):
+                    continue
+                if not name.endswith(WORKBOOK_SUFFIXES):
+                    continue
+                if len(extracted) >= max_files:
+                    raise BatchError(f"A batch holds at most {max_files + start} workbooks")
+
+                path = upload_dir / f"{batch_id}_{start + len(extracted)}{Path(name).suffix}"
+                limit = min(max_file_bytes, max_bytes - total)
+                digest = hashlib.sha256()
+                size = 0
+                try:
+                    with archive.open(member) as source, open(path, 'wb') as target:
+                        for chunk in iter(lambda: source.read(UPLOAD_CHUNK_SIZE), b''):
+                            size += len(chunk)
+                            if size > limit:
+                                raise UploadTooLargeError(f"{name} exceeds {limit} bytes")
+                            digest.update(chunk)
+                            target.write(chunk)
+                except BaseException:
+                    if path.exists():
+                        path.unlink()
+                    raise
+                extracted.append(BatchFile(name, path, digest.hexdigest(), size))
+                total += size
+    except zipfile.BadZipFile as e:
+        for workbook in extracted:
+            workbook.path.unlink()
+        raise BatchError(f"Not a valid zip archive: {str(e)}")
+    except BaseException:
+        for workbook in extracted:
+            workbook.path.unlink()
+        raise
+    return extracted
+
+
+async def run_batch(pool, cache: ResultCache, files: Sequence[BatchFile], formats: Sequence[str],
+                    concurrency: int, combined: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    """Process ``files`` on ``pool``, yielding a result for each file as it finishes, then a summary.
+
+    Up to ``concurrency`` files are in the pipeline at once, each holding
+    a slot of ``pool`` and waiting for a free worker to get one, and their
+    outputs go through ``cache`` like single uploads. A file that fails is
+    reported and the batch goes on. With ``combined``, the summary also
+    carries one output per format covering every successful file, and
+    their consolidated summary. Results hold ``outputs`` as file names by
+    format.
+    """
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    processed: List[Optional[ProcessedWorkbook]] = [None] * len(files)
+
+    async def run_file(index: int, file: BatchFile) -> Dict[str, Any]:
+        result = {'type': 'file', 'index': index, 'filename': file.filename}
+        async with semaphore, pool.slot(wait=True):
+            try:
+                data = None
+                if combined:
+                    # The combined report needs every result, so process
+                    # here and render the per-file outputs from it
+                    data = await run_stage(pool, 'process', process_workbook, file.path)
+                outputs = await cache.get_or_render(pool, file.path, file.content_hash, formats,
+                                                    processed_data=data)
+            except Exception as e:
+                logger.error(f"Batch file {file.filename} failed: {str(e)}")
+                return {**result, 'status': 'failed', 'error': str(e)}
+        processed[index] = data
+        return {**result, 'status': 'success', 'outputs': outputs}
+
+    tasks = [asyncio.create_task(run_file(index, file)) for index, file in enumerate(files)]
+    succeeded = 0
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            succeeded += result['status'] == 'success'
+            yield result
+    finally:
+        # The client may stop reading early; don't leave work behind
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    summary = {'type': 'summary', 'files': len(files), 'succeeded': succeeded, 'failed': len(files) - succeeded}
+    workbooks = [(file, data) for file, data in zip(files, processed) if data is not None]
+    if combined and workbooks:
+        merged = combine_workbooks(
+            f"Batch of {len(workbooks)} workbooks",
+            [replace(data, file_name=Path(file.filename).name) for file, data in workbooks]
+        )
+        # Keyed by the names and contents of the files it covers, in order
+        key = hashlib.sha256('|'.join(f"{file.filename}:{file.content_hash}" for file, _ in workbooks).encode())
+        try:
+            async with pool.slot(wait=True):
+                summary['outputs'] = await cache.get_or_render(pool, Path(merged.file_name), key.hexdigest(),
+                                                               formats, processed_data=merged)
+            summary['consolidated_summary'] = merged.summary.to_dict()
+        except Exception as e:
+            logger.error(f"Combined batch report failed: {str(e)}")
+            summary['combined_error'] = str(e)
+    summary['elapsed_s'] = round(time.perf_counter() - start, 3)
+    yield summary
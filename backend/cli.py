@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Process directories or globs of workbooks offline, without the API server
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+import logging
+from pipeline import OUTPUT_FORMATS, OUTPUT_SUFFIXES, WORKBOOK_SUFFIXES, init_worker, parse_formats, pipeline_fingerprint, run_pipeline
+from result_cache import file_digest
+from sheet_cache import SheetCache
+
+logger = logging.getLogger(__name__)
+
+# Kept in the output directory: what every output was made from
+MANIFEST_NAME = '.manifest.json'
+
+# Also kept there: processed sheets, so that a changed workbook only has
+# its changed sheets processed again
+SHEET_CACHE_NAME = '.sheet_cache.db'
+SHEET_CACHE_MAX_BYTES = 1024 ** 3
+SHEET_CACHE_MAX_AGE = 30 * 24 * 3600  # seconds
+
+
+class Workbook(NamedTuple):
+    """An input workbook and where its outputs go"""
+    path: Path
+    key: str  # output path relative to the output directory, without suffix
+
+
+def find_workbooks(inputs: Sequence[str], recursive: bool = False) -> List[Workbook]:
+    """Workbooks named by ``inputs``: files, directories or glob patterns.
+
+    Outputs of a directory's workbooks keep their path below it, those of
+    files and glob matches only their name. Excel lock files (``~$...``)
+    are skipped.
+    """
+    workbooks = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            matches = sorted(path.glob('**/*' if recursive else '*'))
+            workbooks.extend(
+                Workbook(match, match.relative_to(path).with_suffix('').as_posix())
+                for match in matches if _is_workbook(match)
+            )
+        elif path.is_file():
+            workbooks.append(Workbook(path, path.stem))
+        else:
+            matches = [Path(match) for match in sorted(glob.glob(item, recursive=True))]
+            if not matches:
+                logger.warning(f"No workbooks match {item}")
+            workbooks.extend(Workbook(match, match.stem) for match in matches if _is_workbook(match))
+    return workbooks
+
+
+def _is_workbook(path: Path) -> bool:
+    return path.is_file() and path.name.endswith(WORKBOOK_SUFFIXES) and not path.name.startswith('~$')
+
+
+def output_paths(workbook: Workbook, output_dir: Path, formats: Sequence[str]) -> Dict[str, Path]:
+    return {fmt: output_dir / f"{workbook.key}_processed{OUTPUT_SUFFIXES[fmt]}" for fmt in formats}
+
+
+class Manifest:
+    """Size, mtime and content hash of the inputs behind the outputs in a directory.
+
+    A workbook is up to date when all its requested outputs exist and were
+    made by the same pipeline version from an input with the same size and
+    mtime, or, failing that, the same content hash.
+    """
+
+    def __init__(self, path: Path, fingerprint: str):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            manifest = json.loads(path.read_text())
+            # Outputs of another processor or renderer version are all stale
+            if manifest.get('fingerprint') == fingerprint:
+                self.entries = manifest['entries']
+
+    def up_to_date(self, workbook: Workbook, outputs: Dict[str, Path]) -> bool:
+        entry = self.entries.get(workbook.key)
+        if entry is None or not set(outputs) <= set(entry['formats']):
+            return False
+        if not all(path.exists() for path in outputs.values()):
+            return False
+        stat = workbook.path.stat()
+        if (stat.st_size, stat.st_mtime_ns) == (entry['size'], entry['mtime_ns']):
+            return True
+        # Touched or copied, but maybe not changed
+        if file_digest(workbook.path) != entry['content_hash']:
+            return False
+        entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        return True
+
+    def record(self, workbook: Workbook, stat: os.stat_result, content_hash: str, formats: Sequence[str]):
+        entry = self.entries.get(workbook.key)
+        if entry is not None and entry['content_hash'] == content_hash:
+            # Outputs of other formats made earlier from the same content are still current
+            formats = [fmt for fmt in OUTPUT_FORMATS if fmt in formats or fmt in entry['formats']]
+        self.entries[workbook.key] = {
+            'source': str(workbook.path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'content_hash': content_hash,
+            'formats': list(formats),
+        }
+
+    def save(self):
+        partial = self.path.with_name(self.path.name + '.partial')
+        partial.write_text(json.dumps({'fingerprint': self.fingerprint, 'entries': self.entries}, indent=1))
+        os.replace(partial, self.path)
+
+
+def process_file(path: Path, outputs: Dict[str, Path]) -> Tuple[int, str]:
+    """Run the pipeline on one workbook in a pool worker; its row count and content hash
+
+    Outputs are written under temporary names and renamed when complete,
+    so an interrupted run never leaves a truncated output behind.
+    """
+    content_hash = file_digest(path)
+    partial = {fmt: output.with_name(output.name + '.partial') for fmt, output in outputs.items()}
+    try:
+        processed_data = run_pipeline(path, partial)
+        for fmt, output in outputs.items():
+            os.replace(partial[fmt], output)
+    finally:
+        for output in partial.values():
+            if output.exists():
+                output.unlink()
+    return processed_data.row_count(), content_hash
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('inputs', nargs='+', help="workbooks, directories or glob patterns (quote them)")
+    parser.add_argument('-o', '--output-dir', type=Path, default=Path("outputs"))
+    parser.add_argument('--formats', default="pdf,excel", help="comma-separated: pdf, excel")
+    parser.add_argument('-r', '--recursive', action='store_true', help="include subdirectories")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--force', action='store_true', help="reprocess workbooks whose outputs are up to date")
+    parser.add_argument('--no-sheet-cache', action='store_true', help="process every sheet of changed workbooks")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    # Options may come between the inputs
+    args = parser.parse_intermixed_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    try:
+        formats = parse_formats(args.formats)
+    except ValueError as e:
+        parser.error(f"--formats: {str(e)}")
+
+    workbooks = find_workbooks(args.inputs, args.recursive)
+    keys = [workbook.key for workbook in workbooks]
+    duplicates = sorted({key for key in keys if keys.count(key) > 1})
+    if duplicates:
+        parser.error(f"Several inputs would write the same outputs: {', '.join(duplicates)}")
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(args.output_dir / MANIFEST_NAME, pipeline_fingerprint())
+    pending = []
+    for workbook in workbooks:
+        outputs = output_paths(workbook, args.output_dir, formats)
+        if not args.force and manifest.up_to_date(workbook, outputs):
+            continue
+        for output in outputs.values():
+            output.parent.mkdir(parents=True, exist_ok=True)
+        pending.append((workbook, outputs, workbook.path.stat()))
+    skipped = len(workbooks) - len(pending)
+    print(f"{len(workbooks)} workbooks, {skipped} up to date, {len(pending)} to process")
+
+    sheet_cache = None
+    if not args.no_sheet_cache:
+        sheet_cache = SheetCache(args.output_dir / SHEET_CACHE_NAME, SHEET_CACHE_MAX_BYTES, SHEET_CACHE_MAX_AGE)
+
+    start = time.perf_counter()
+    rows = 0
+    size = 0
+    failed = 0
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers,
+                                 initializer=partial(init_worker, sheet_cache)) as executor:
+            futures = {
+                executor.submit(process_file, workbook.path, outputs): (workbook, stat)
+                for workbook, outputs, stat in pending
+            }
+            for future in as_completed(futures):
+                workbook, stat = futures[future]
+                try:
+                    file_rows, content_hash = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"failed {workbook.path}: {str(e)}", file=sys.stderr)
+                    continue
+                manifest.record(workbook, stat, content_hash, formats)
+                rows += file_rows
+                size += stat.st_size
+                print(f"done   {workbook.path} ({file_rows} rows)")
+    finally:
+        # Keep what finished, even when interrupted
+        manifest.save()
+
+    elapsed = time.perf_counter() - start
+    processed = len(pending) - failed
+    print(f"Processed {processed} workbooks ({skipped} up to date, {failed} failed) in {elapsed:.1f} s")
+    if processed and elapsed > 0:
+        print(f"{processed / elapsed:.2f} files/s, {rows / elapsed:,.0f} rows/s, "
+              f"{size / elapsed / 1024 ** 2:.1f} MB/s")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
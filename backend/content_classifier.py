@@ -0,0 +1,121 @@
+import re
+import pandas as pd
+from typing import Dict, List, Optional, Set
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ContentClassifier:
+    """Keyword based estimate / financial / mixed classifier for a sheet.
+
+    Cells are scanned once, block by block, with a single compiled
+    alternation of all keywords. Keywords already found are dropped from
+    the pattern, the scan stops as soon as further matches cannot change
+    the decision, and long sheets are decided from a leading sample of rows
+    when that sample is conclusive enough.
+    """
+
+    def __init__(self, estimate_keywords: List[str], financial_keywords: List[str],
+                 min_score: int = 2, sample_rows: Optional[int] = None,
+                 confidence: int = 3, block_rows: int = 1000):
+        self.estimate_keywords = list(estimate_keywords)
+        self.financial_keywords = list(financial_keywords)
+        self.min_score = min_score
+        self.sample_rows = sample_rows
+        self.confidence = confidence
+        self.block_rows = block_rows
+
+        self._estimate_set = {keyword.lower() for keyword in self.estimate_keywords}
+        self._financial_set = {keyword.lower() for keyword in self.financial_keywords}
+        keywords = self._estimate_set | self._financial_set
+
+        # A match at some position also proves every keyword that is a prefix
+        # of it; other overlaps are found at their own positions
+        self._implied: Dict[str, Set[str]] = {
+            keyword: {other for other in keywords if keyword.startswith(other)}
+            for keyword in keywords
+        }
+        self._pattern_cache: Dict[frozenset, re.Pattern] = {}
+
+    @property
+    def keywords(self) -> tuple:
+        """Keyword configuration this classifier was built from"""
+        return (tuple(self.estimate_keywords), tuple(self.financial_keywords))
+
+    def classify(self, df: pd.DataFrame) -> str:
+        """Return 'estimate', 'financial' or 'mixed' for a frame of text cells"""
+        found: Set[str] = set()
+        remaining = set(self._implied)
+        n_rows = len(df)
+        values = df.to_numpy()
+
+        for start in range(0, n_rows, self.block_rows):
+            if not remaining:
+                break
+
+            block = values[start:start + self.block_rows]
+            text = ' '.join(block.ravel()).lower()
+            for match in self._pattern(remaining).finditer(text):
+                hits = self._implied[match.group(1)]
+                found |= hits
+                remaining -= hits
+
+            decision = self._certain_decision(found)
+            if decision is not None:
+                return decision
+
+            scanned = start + len(block)
+            if self.sample_rows and scanned >= self.sample_rows and scanned < n_rows:
+                decision = self._decide(found)
+                if decision != 'mixed' and self._margin(found) >= self.confidence:
+                    logger.debug(f"Classified from the first {scanned} of {n_rows} rows")
+                    return decision
+
+        return self._decide(found)
+
+    def _scores(self, found: Set[str]) -> tuple:
+        return len(found & self._estimate_set), len(found & self._financial_set)
+
+    def _margin(self, found: Set[str]) -> int:
+        estimate_score, financial_score = self._scores(found)
+        return abs(estimate_score - financial_score)
+
+    def _decide(self, found: Set[str]) -> str:
+        """Decision for the keywords found so far"""
+        estimate_score, financial_score = self._scores(found)
+        if estimate_score > financial_score and estimate_score > self.min_score:
+            return 'estimate'
+        elif financial_score > estimate_score and financial_score > self.min_score:
+            return 'financial'
+        else:
+            return 'mixed'
+
+    def _certain_decision(self, found: Set[str]) -> Optional[str]:
+        """Decision if no further keyword can change it, else None"""
+        estimate_score, financial_score = self._scores(found)
+        estimate_left = len(self._estimate_set) - estimate_score
+        financial_left = len(self._financial_set) - financial_score
+
+        if estimate_score > self.min_score and estimate_score > financial_score + financial_left:
+            return 'estimate'
+        if financial_score > self.min_score and financial_score > estimate_score + estimate_left:
+            return 'financial'
+
+        estimate_possible = estimate_score + estimate_left > max(self.min_score, financial_score)
+        financial_possible = financial_score + financial_left > max(self.min_score, estimate_score)
+        if not estimate_possible and not financial_possible:
+            return 'mixed'
+        return None
+
+    def _pattern(self, keywords: Set[str]) -> re.Pattern:
+        """Compiled alternation of ``keywords``, longest first, matching overlaps"""
+        key = frozenset(keywords)
+        pattern = self._pattern_cache.get(key)
+        if pattern is None:
+            alternatives = sorted(keywords, key=lambda keyword: (-len(keyword), keyword))
+            if len(self._pattern_cache) >= 64:
+                self._pattern_cache.clear()
+            pattern = re.compile('(?=(' + '|'.join(re.escape(keyword) for keyword in alternatives) + '))')
+            self._pattern_cache[key] = pattern
+        return pattern
@@ -1,17 +1,92 @@
 import pandas as pd
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Border, Side, Alignment, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
+from openpyxl.utils import get_column_letter
 from openpyxl.utils.dataframe import dataframe_to_rows
-from typing import Dict, List, Any
+from itertools import chain, islice
+from typing import Callable, Dict, Iterable, List, Any, Optional, Tuple
 import logging
 from pathlib import Path
+from processed_data import ProcessedWorkbook, EstimateSheet, FinancialSheet, DataSheet
+from instrumentation import stage
 
 logger = logging.getLogger(__name__)
 
+# A sheet is described as rows of (value, style name) cells, so the same
+# layout can be written to a regular or a write-only workbook. BLANK leaves
+# a cell empty and unstyled.
+Row = List[Tuple[Any, Optional[str]]]
+BLANK = (None, None)
+
+NUMBER_FORMAT = '#,##0.00'
+MAX_COLUMN_WIDTH = 50
+
+
+class ColumnWidths:
+    """Running per-column maximum of text length, fed one layout row at a time.
+    
+    Only the first ``sample_rows`` rows are measured when a sample size is
+    given, so very tall sheets are fitted from their leading rows.
+    """
+    
+    def __init__(self, sample_rows: Optional[int] = None):
+        self.sample_rows = sample_rows
+        self.max_lengths: List[int] = []
+        self.rows = 0
+    
+    def add(self, row: Row):
+        if self.sample_rows is not None and self.rows >= self.sample_rows:
+            return
+        self.rows += 1
+        max_lengths = self.max_lengths
+        if len(row) > len(max_lengths):
+            max_lengths.extend([0] * (len(row) - len(max_lengths)))
+        for column, (value, _) in enumerate(row):
+            if value is not None:
+                length = len(value) if isinstance(value, str) else len(str(value))
+                if length > max_lengths[column]:
+                    max_lengths[column] = length
+    
+    def add_frame(self, frame: pd.DataFrame):
+        """Measure a block of rows column by column"""
+        if self.sample_rows is not None:
+            frame = frame.iloc[:max(0, self.sample_rows - self.rows)]
+        self.rows += len(frame)
+        max_lengths = self.max_lengths
+        if frame.shape[1] > len(max_lengths):
+            max_lengths.extend([0] * (frame.shape[1] - len(max_lengths)))
+        for column in range(frame.shape[1]):
+            values = frame.iloc[:, column].dropna()
+            if values.empty:
+                continue
+            length = int(values.astype(str).str.len().max())
+            if length > max_lengths[column]:
+                max_lengths[column] = length
+    
+    def widths(self) -> Dict[str, float]:
+        """Fitted width of every column seen, by column letter"""
+        return {
+            get_column_letter(column): min(max_length + 2, MAX_COLUMN_WIDTH)
+            for column, max_length in enumerate(self.max_lengths, 1)
+        }
+
+
 class ExcelGenerator:
-    def __init__(self):
+    def __init__(self, write_only: Optional[bool] = None, write_only_min_rows: int = 20000,
+                 width_sample_rows: Optional[int] = 10000):
+        # write_only=True streams rows through an openpyxl write-only workbook
+        # instead of holding every cell in memory; None picks it for
+        # workbooks with at least write_only_min_rows data rows
+        self.write_only = write_only
+        self.write_only_min_rows = write_only_min_rows
+        # Column widths are fitted to the first width_sample_rows rows of a
+        # sheet (None: every row)
+        self.width_sample_rows = width_sample_rows
         self.header_font = Font(bold=True, color="FFFFFF")
         self.header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        self.total_fill = PatternFill(start_color="D9E2F3", end_color="D9E2F3", fill_type="solid")
         self.border = Border(
             left=Side(style='thin'),
             right=Side(style='thin'),
@@ -20,239 +95,244 @@ class ExcelGenerator:
         )
         self.center_alignment = Alignment(horizontal='center', vertical='center')
         self.right_alignment = Alignment(horizontal='right', vertical='center')
+        self.styles = self._build_styles()
+    
+    def _build_styles(self) -> Dict[str, Dict[str, Any]]:
+        """Cell formats of the named styles used by the generated sheets"""
+        bold = Font(bold=True)
+        return {
+            'Summary Title': {'font': Font(bold=True, size=16, color="366092")},
+            'Sheet Title': {'font': Font(bold=True, size=14, color="366092")},
+            'Bold': {'font': bold},
+            'Section Name': {'font': Font(bold=True, size=12)},
+            'Summary Label': {'font': bold, 'border': self.border},
+            'Summary Value': {'border': self.border},
+            'Summary Total': {'font': Font(bold=True, size=14), 'border': self.border},
+            'Table Header': {
+                'font': self.header_font, 'fill': self.header_fill,
+                'border': self.border, 'alignment': self.center_alignment
+            },
+            'Table Cell': {'border': self.border},
+            'Table Number': {
+                'border': self.border, 'alignment': self.right_alignment, 'number_format': NUMBER_FORMAT
+            },
+            'Total Label': {'font': bold, 'border': self.border, 'fill': self.total_fill},
+            'Total Number': {
+                'font': bold, 'border': self.border, 'fill': self.total_fill,
+                'alignment': self.right_alignment, 'number_format': NUMBER_FORMAT
+            },
+        }
     
-    def generate_excel(self, data: Dict[str, Any], output_path: Path):
+    def generate_excel(self, data: ProcessedWorkbook, output_path: Path):
         """Generate formatted Excel file from processed data"""
         try:
-            wb = Workbook()
+            write_only = self._use_write_only(data)
+            wb = Workbook(write_only=write_only)
+            if not write_only:
+                # Remove default sheet
+                wb.remove(wb.active)
             
-            # Remove default sheet
-            wb.remove(wb.active)
+            # Register the shared styles; cells refer to them by name, so the
+            # style table stays the same size however many rows are written
+            for style in self._named_styles():
+                wb.add_named_style(style)
             
             # Add summary sheet
             self._create_summary_sheet(wb, data)
             
             # Add estimate sheets
-            for estimate in data['estimates']:
+            for estimate in data.estimates:
                 self._create_estimate_sheet(wb, estimate)
             
             # Add financial statement sheets
-            for financial in data['financial_statements']:
+            for financial in data.financial_statements:
                 self._create_financial_sheet(wb, financial)
             
             # Add raw data sheets
-            for sheet_name, sheet_data in data['sheets'].items():
+            for sheet_name, sheet_data in data.sheets.items():
                 self._create_raw_data_sheet(wb, sheet_name, sheet_data)
             
             # Save workbook
-            wb.save(output_path)
+            with stage('xlsx_save', write_only=write_only):
+                wb.save(output_path)
             logger.info(f"Excel file generated successfully: {output_path}")
-            
+        
         except Exception as e:
             logger.error(f"Error generating Excel file: {str(e)}")
             raise
     
-    def _create_summary_sheet(self, wb: Workbook, data: Dict[str, Any]):
+    def _named_styles(self) -> List[NamedStyle]:
+        """Fresh NamedStyle objects for one workbook, which they get bound to"""
+        # Formats without a font keep the workbook's default one
+        return [
+            NamedStyle(name=name, **{'font': DEFAULT_FONT, **attributes})
+            for name, attributes in self.styles.items()
+        ]
+    
+    def _use_write_only(self, data: ProcessedWorkbook) -> bool:
+        """Whether to stream this workbook through write-only worksheets"""
+        if self.write_only is not None:
+            return self.write_only
+        rows = sum(len(estimate.items) for estimate in data.estimates)
+        rows += sum(len(section.items) for financial in data.financial_statements
+                    for section in financial.sections)
+        rows += sum(len(sheet_data.data) for sheet_data in data.sheets.values())
+        return rows >= self.write_only_min_rows
+    
+    def _create_summary_sheet(self, wb: Workbook, data: ProcessedWorkbook):
         """Create summary sheet"""
-        ws = wb.create_sheet("Summary")
-        
-        # Add title
-        ws['A1'] = "FINANCIAL DOCUMENT PROCESSOR - SUMMARY"
-        ws['A1'].font = Font(bold=True, size=16, color="366092")
-        ws.merge_cells('A1:D1')
-        
-        # Add file information
-        ws['A3'] = f"Source File: {data['file_name']}"
-        ws['A3'].font = Font(bold=True)
+        self._write_sheet(
+            wb, "Summary", lambda: self._summary_rows(data),
+            merge='A1:D1', widths={'A': 25, 'B': 15}
+        )
+    
+    def _summary_rows(self, data: ProcessedWorkbook) -> Iterable[Row]:
+        # Title and file information
+        yield [("FINANCIAL DOCUMENT PROCESSOR - SUMMARY", 'Summary Title')]
+        yield []
+        yield [(f"Source File: {data.file_name}", 'Bold')]
+        yield []
         
-        # Add summary data
-        row = 5
+        # Summary data, grand total last
         summary_data = [
-            ("Total Estimates", data['summary']['total_estimates']),
-            ("Total Financial Statements", data['summary']['total_financial_statements']),
-            ("Total Sheets Processed", data['summary']['total_sheets']),
-            ("Grand Total", f"${data['summary']['grand_total']:.2f}")
+            ("Total Estimates", data.summary.total_estimates),
+            ("Total Financial Statements", data.summary.total_financial_statements),
+            ("Total Sheets Processed", data.summary.total_sheets),
+            ("Grand Total", f"${data.summary.grand_total:.2f}")
         ]
-        
-        for label, value in summary_data:
-            ws[f'A{row}'] = label
-            ws[f'B{row}'] = value
-            ws[f'A{row}'].font = Font(bold=True)
-            if row == len(summary_data) + 4:  # Grand total row
-                ws[f'B{row}'].font = Font(bold=True, size=14)
-            row += 1
-        
-        # Format summary sheet
-        self._format_summary_sheet(ws)
+        for position, (label, value) in enumerate(summary_data, 1):
+            value_style = 'Summary Total' if position == len(summary_data) else 'Summary Value'
+            yield [(label, 'Summary Label'), (value, value_style)]
     
-    def _create_estimate_sheet(self, wb: Workbook, estimate: Dict[str, Any]):
+    def _create_estimate_sheet(self, wb: Workbook, estimate: EstimateSheet):
         """Create estimate sheet"""
-        ws = wb.create_sheet(f"Estimate_{estimate['sheet_name']}")
-        
-        # Add title
-        ws['A1'] = estimate['title']
-        ws['A1'].font = Font(bold=True, size=14, color="366092")
-        ws.merge_cells('A1:D1')
-        
-        # Add headers
-        headers = ['Description', 'Quantity', 'Unit Price', 'Total']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=3, column=col, value=header)
-            cell.font = self.header_font
-            cell.fill = self.header_fill
-            cell.border = self.border
-            cell.alignment = self.center_alignment
-        
-        # Add data rows
-        row = 4
-        for item in estimate['items']:
-            ws.cell(row=row, column=1, value=item['description'])
-            ws.cell(row=row, column=2, value=item['quantity'])
-            ws.cell(row=row, column=3, value=item['unit_price'])
-            ws.cell(row=row, column=4, value=item['total'])
-            
-            # Format row
-            for col in range(1, 5):
-                cell = ws.cell(row=row, column=col)
-                cell.border = self.border
-                if col in [2, 3, 4]:  # Numeric columns
-                    cell.alignment = self.right_alignment
-                    cell.number_format = '#,##0.00'
-            
-            row += 1
+        self._write_sheet(
+            wb, f"Estimate_{estimate.sheet_name}", lambda: self._estimate_rows(estimate), merge='A1:D1'
+        )
+    
+    def _estimate_rows(self, estimate: EstimateSheet) -> Iterable[Row]:
+        yield [(estimate.title, 'Sheet Title')]
+        yield []
         
-        # Add total row
-        ws.cell(row=row, column=3, value="TOTAL:")
-        ws.cell(row=row, column=4, value=estimate['total'])
+        # Headers
+        yield [(header, 'Table Header') for header in ['Description', 'Quantity', 'Unit Price', 'Total']]
         
-        # Format total row
-        for col in range(3, 5):
-            cell = ws.cell(row=row, column=col)
-            cell.font = Font(bold=True)
-            cell.border = self.border
-            cell.fill = PatternFill(start_color="D9E2F3", end_color="D9E2F3", fill_type="solid")
-            if col == 4:
-                cell.alignment = self.right_alignment
-                cell.number_format = '#,##0.00'
+        # Data rows
+        for description, quantity, unit_price, total in estimate.items.rows():
+            yield [
+                (description, 'Table Cell'),
+                (quantity, 'Table Number'),
+                (unit_price, 'Table Number'),
+                (total, 'Table Number')
+            ]
         
-        # Auto-adjust column widths
-        self._auto_adjust_columns(ws)
+        # Total row
+        yield [BLANK, BLANK, ("TOTAL:", 'Total Label'), (estimate.total, 'Total Number')]
     
-    def _create_financial_sheet(self, wb: Workbook, financial: Dict[str, Any]):
+    def _create_financial_sheet(self, wb: Workbook, financial: FinancialSheet):
         """Create financial statement sheet"""
-        ws = wb.create_sheet(f"Financial_{financial['sheet_name']}")
-        
-        # Add title
-        ws['A1'] = financial['title']
-        ws['A1'].font = Font(bold=True, size=14, color="366092")
-        ws.merge_cells('A1:B1')
-        
-        row = 3
+        self._write_sheet(
+            wb, f"Financial_{financial.sheet_name}", lambda: self._financial_rows(financial), merge='A1:B1'
+        )
+    
+    def _financial_rows(self, financial: FinancialSheet) -> Iterable[Row]:
+        yield [(financial.title, 'Sheet Title')]
+        yield []
         
-        # Process sections
-        for section in financial['sections']:
-            # Section header
-            ws.cell(row=row, column=1, value=section['name'])
-            ws.cell(row=row, column=1).font = Font(bold=True, size=12)
-            row += 1
+        for section in financial.sections:
+            yield [(section.name, 'Section Name')]
             
-            # Section items
-            if section['items']:
-                # Headers
-                ws.cell(row=row, column=1, value="Description")
-                ws.cell(row=row, column=2, value="Amount")
-                
-                for col in range(1, 3):
-                    cell = ws.cell(row=row, column=col)
-                    cell.font = self.header_font
-                    cell.fill = self.header_fill
-                    cell.border = self.border
-                    cell.alignment = self.center_alignment
-                
-                row += 1
-                
-                # Items
-                for item in section['items']:
-                    ws.cell(row=row, column=1, value=item['description'])
-                    ws.cell(row=row, column=2, value=item['amount'])
-                    
-                    # Format row
-                    for col in range(1, 3):
-                        cell = ws.cell(row=row, column=col)
-                        cell.border = self.border
-                        if col == 2:  # Amount column
-                            cell.alignment = self.right_alignment
-                            cell.number_format = '#,##0.00'
-                    
-                    row += 1
+            if len(section.items):
+                yield [("Description", 'Table Header'), ("Amount", 'Table Header')]
+                for description, amount in section.items.rows():
+                    yield [(description, 'Table Cell'), (amount, 'Table Number')]
             
-            row += 1  # Space between sections
-        
-        # Auto-adjust column widths
-        self._auto_adjust_columns(ws)
+            yield []  # Space between sections
     
-    def _create_raw_data_sheet(self, wb: Workbook, sheet_name: str, sheet_data: Dict[str, Any]):
+    def _create_raw_data_sheet(self, wb: Workbook, sheet_name: str, sheet_data: DataSheet):
         """Create raw data sheet"""
-        ws = wb.create_sheet(f"Raw_{sheet_name}")
-        
-        # Add title
-        ws['A1'] = sheet_data['title']
-        ws['A1'].font = Font(bold=True, size=14, color="366092")
-        
-        # Add headers
-        if 'headers' in sheet_data:
-            for col, header in enumerate(sheet_data['headers'], 1):
-                cell = ws.cell(row=3, column=col, value=header)
-                cell.font = self.header_font
-                cell.fill = self.header_fill
-                cell.border = self.border
-                cell.alignment = self.center_alignment
-        
-        # Add data
-        if 'data' in sheet_data:
-            row = 4
-            for record in sheet_data['data']:
-                for col, (key, value) in enumerate(record.items(), 1):
-                    cell = ws.cell(row=row, column=col, value=value)
-                    cell.border = self.border
-                row += 1
-        
-        # Auto-adjust column widths
-        self._auto_adjust_columns(ws)
+        self._write_sheet(
+            wb, f"Raw_{sheet_name}", lambda: self._raw_data_rows(sheet_data), table=sheet_data.data
+        )
     
-    def _format_summary_sheet(self, ws):
-        """Format summary sheet"""
-        # Set column widths
-        ws.column_dimensions['A'].width = 25
-        ws.column_dimensions['B'].width = 15
-        
-        # Add borders to data area
-        for row in range(5, 9):
-            for col in range(1, 3):
-                ws.cell(row=row, column=col).border = self.border
+    def _raw_data_rows(self, sheet_data: DataSheet) -> Iterable[Row]:
+        yield [(sheet_data.title, 'Sheet Title')]
+        yield []
+        yield [(header, 'Table Header') for header in sheet_data.headers]
     
-    def _auto_adjust_columns(self, ws):
-        """Auto-adjust column widths"""
-        for column in ws.columns:
-            max_length = 0
-            column_letter = None
+    def _write_sheet(self, wb: Workbook, title: str, rows: Callable[[], Iterable[Row]],
+                     merge: Optional[str] = None, widths: Optional[Dict[str, float]] = None,
+                     table: Optional[pd.DataFrame] = None, table_style: str = 'Table Cell'):
+        """Write a sheet from its row layout, in the workbook's mode.
+        
+        ``rows`` returns a fresh iterator over the layout. ``table`` rows,
+        all in ``table_style``, follow it and are appended straight from the
+        frame's columns. ``widths`` fixes column widths; without it columns
+        are fitted to their content as the rows go by.
+        """
+        with stage('xlsx_sheet', rows=0, sheet=title) as record:
+            ws = wb.create_sheet(title)
+            fitted = ColumnWidths(self.width_sample_rows) if widths is None else None
+            layout = iter(rows())
+            head: List[Row] = []
             
-            # Find the first non-merged cell to get column letter
-            for cell in column:
-                if hasattr(cell, 'column_letter'):
-                    column_letter = cell.column_letter
-                    break
+            if wb.write_only:
+                # Column widths have to be known before the first row is streamed:
+                # they are fitted to a buffered leading sample, or to every row in
+                # an extra pass over the layout values when sampling is off
+                if fitted is not None:
+                    if self.width_sample_rows is None:
+                        for row in rows():
+                            fitted.add(row)
+                    else:
+                        head = list(islice(layout, self.width_sample_rows))
+                        for row in head:
+                            fitted.add(row)
+                    if table is not None:
+                        fitted.add_frame(table)
+                    widths = fitted.widths()
+                self._set_widths(ws, widths)
+                if merge:
+                    ws.merged_cells.add(merge)
             
-            if column_letter is None:
-                continue  # Skip if we can't determine column letter
+            style_arrays = {}
+            measure = fitted is not None and not wb.write_only
+            for row in chain(head, layout):
+                if measure:
+                    fitted.add(row)
+                ws.append([self._styled_cell(ws, value, style, style_arrays) for value, style in row])
+                record['rows'] += 1
             
-            for cell in column:
-                try:
-                    if hasattr(cell, 'value') and cell.value is not None:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                except:
-                    pass
+            if table is not None:
+                if measure:
+                    fitted.add_frame(table)
+                style_array = self._style_array(ws, table_style, style_arrays)
+                for values in table.itertuples(index=False, name=None):
+                    ws.append([Cell(ws, row=1, column=1, value=value, style_array=style_array) for value in values])
+                record['rows'] += len(table)
             
-            adjusted_width = min(max_length + 2, 50)  # Cap at 50 characters
-            ws.column_dimensions[column_letter].width = adjusted_width
+            if not wb.write_only:
+                if merge:
+                    ws.merge_cells(merge)
+                self._set_widths(ws, widths if fitted is None else fitted.widths())
+    
+    def _set_widths(self, ws, widths: Dict[str, float]):
+        for column_letter, width in widths.items():
+            ws.column_dimensions[column_letter].width = width
+    
+    def _styled_cell(self, ws, value: Any, style: Optional[str], style_arrays: Dict[str, Any]):
+        """Value or styled cell for ws.append"""
+        if style is None:
+            return value
+        return Cell(ws, row=1, column=1, value=value, style_array=self._style_array(ws, style, style_arrays))
+    
+    def _style_array(self, ws, style: str, style_arrays: Dict[str, Any]):
+        """Style ids of a named style in this sheet's workbook"""
+        style_array = style_arrays.get(style)
+        if style_array is None:
+            # Resolving a named style by name is slow, so it is done once per
+            # sheet and the resulting style ids are copied into every cell
+            cell = WriteOnlyCell(ws)
+            cell.style = style
+            style_array = style_arrays[style] = cell._style
+        return style_array
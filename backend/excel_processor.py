@@ -1,60 +1,129 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Any, Tuple
-import re
+from typing import Dict, List, Any, Optional, Sequence, Tuple, Union
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import logging
+import os
+import threading
+from numeric_extractor import NumericExtractor, is_numeric_column
+from workbook_reader import WorkbookReader, select_sheets
+from content_classifier import ContentClassifier
+from instrumentation import stage
+from sheet_cache import SheetCache
+from processed_data import (
+    ProcessedWorkbook, EstimateSheet, EstimateItems, FinancialSheet, FinancialSection,
+    FinancialItems, DataSheet, Summary
+)
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever a change alters the processed result for the same input,
+# so cached outputs built by older code are not reused
+PROCESSOR_VERSION = 1
+
+SheetResult = Union[EstimateSheet, FinancialSheet, DataSheet]
+
 class ExcelProcessor:
-    def __init__(self):
-        self.estimate_keywords = [
+    def __init__(self, typed: bool = True, estimate_keywords: List[str] = None,
+                 financial_keywords: List[str] = None, classifier_sample_rows: int = 5000,
+                 classifier_confidence: int = 3, max_workers: Optional[int] = None,
+                 parallel_min_sheets: int = 8, executor: str = 'process', keep_row_data: bool = False,
+                 sheet_cache: Optional[SheetCache] = None):
+        # Typed mode keeps numeric columns as numbers instead of stringifying
+        # the whole sheet; typed=False restores the all-string behaviour
+        self.typed = typed
+        self.estimate_keywords = list(estimate_keywords) if estimate_keywords is not None else [
             'estimate', 'quote', 'proposal', 'cost', 'price', 'amount',
             'labor', 'materials', 'equipment', 'subtotal', 'total'
         ]
-        self.financial_keywords = [
+        self.financial_keywords = list(financial_keywords) if financial_keywords is not None else [
             'revenue', 'income', 'expense', 'profit', 'loss', 'balance',
             'assets', 'liabilities', 'equity', 'cash flow', 'statement'
         ]
+        self.section_keywords = ['total', 'subtotal', 'summary', 'section']
+        # Sheets longer than classifier_sample_rows are classified from their
+        # first rows when the keyword score margin reaches classifier_confidence
+        self.classifier_sample_rows = classifier_sample_rows
+        self.classifier_confidence = classifier_confidence
+        # Workbooks with at least parallel_min_sheets sheets are processed on
+        # a pool of max_workers (default: CPU count) processes or threads
+        if executor not in ('process', 'thread'):
+            raise ValueError(f"Unknown executor: {executor}")
+        self.max_workers = max_workers
+        self.parallel_min_sheets = parallel_min_sheets
+        self.executor = executor
+        # Items only carry a copy of their source row when keep_row_data is
+        # set; the generators never read it
+        self.keep_row_data = keep_row_data
+        # Sheets whose fingerprint is in sheet_cache are taken from it
+        # instead of being read and processed again
+        self.sheet_cache = sheet_cache
+        self.extractor = NumericExtractor()
+        self._classifier = None
     
-    def process_file(self, file_path: Path) -> Dict[str, Any]:
-        """Process Excel file and return structured data"""
+    def config_fingerprint(self) -> str:
+        """Version and settings that affect the processed result"""
+        return repr((
+            PROCESSOR_VERSION, self.typed, self.estimate_keywords, self.financial_keywords,
+            self.section_keywords, self.classifier_sample_rows, self.classifier_confidence,
+            self.keep_row_data
+        ))
+    
+    def process_file(self, file_path: Path, data: Optional[bytes] = None,
+                     sheets: Optional[Sequence[str]] = None) -> ProcessedWorkbook:
+        """Process Excel file and return structured data
+
+        ``data`` optionally holds the file's bytes, read instead of the file.
+        ``sheets`` limits processing to the sheets matching those names or
+        patterns (see select_sheets); the others are never read.
+        Use ``to_dict()`` on the result for the plain nested-dict layout.
+        """
         try:
-            # Read Excel file
-            df = pd.read_excel(file_path, sheet_name=None)
+            processed_data = ProcessedWorkbook(
+                file_name=file_path.name,
+                sheets={},
+                estimates=[],
+                financial_statements=[],
+                summary=None
+            )
             
-            processed_data = {
-                'file_name': file_path.name,
-                'sheets': {},
-                'estimates': [],
-                'financial_statements': [],
-                'summary': {}
-            }
+            # Stream the workbook one sheet at a time instead of loading every
+            # sheet up front; each frame is dropped once it has been processed.
+            # Sheets unchanged since an earlier upload are not read at all.
+            results = {}
+            with WorkbookReader(file_path, data) as reader:
+                sheet_names = select_sheets(reader.sheet_names(), sheets)
+                keys = self._sheet_keys(reader, sheet_names)
+                if keys:
+                    results = self._cached_sheets(keys)
+                pending = [name for name in sheet_names if name not in results]
+                parallel = self._use_parallel(len(pending))
+                if not parallel:
+                    for sheet_name in pending:
+                        with stage('read', sheet=sheet_name) as record:
+                            sheet_df = reader.read_sheet(sheet_name)
+                            record['rows'] = len(sheet_df)
+                        results[sheet_name] = self._process_sheet(sheet_df, sheet_name)
             
-            for sheet_name, sheet_df in df.items():
-                logger.info(f"Processing sheet: {sheet_name}")
-                
-                # Clean the dataframe
-                cleaned_df = self._clean_dataframe(sheet_df)
-                
-                # Detect content type
-                content_type = self._detect_content_type(cleaned_df)
-                
-                # Process based on content type
-                if content_type == 'estimate':
-                    estimate_data = self._process_estimate(cleaned_df, sheet_name)
-                    processed_data['estimates'].append(estimate_data)
-                elif content_type == 'financial':
-                    financial_data = self._process_financial_statement(cleaned_df, sheet_name)
-                    processed_data['financial_statements'].append(financial_data)
-                else:
-                    # Mixed or unknown content
-                    mixed_data = self._process_mixed_content(cleaned_df, sheet_name)
-                    processed_data['sheets'][sheet_name] = mixed_data
+            if parallel:
+                # Sheets processed on other workers are recorded as one stage
+                with stage('sheets_parallel', sheets=len(pending)):
+                    results.update(zip(pending, self._process_sheets_parallel(file_path, pending, data)))
+            
+            if keys:
+                self._cache_sheets(keys, {name: results[name] for name in pending if name in keys})
+            if pending != sheet_names:
+                logger.info(f"Reused {len(sheet_names) - len(pending)} of {len(sheet_names)} sheets "
+                            f"of {file_path.name} from the sheet cache")
+            
+            # Merged in workbook order, wherever each result came from
+            for sheet_name in sheet_names:
+                content_type, sheet_data = results.pop(sheet_name)
+                self._add_sheet_result(processed_data, sheet_name, content_type, sheet_data)
             
             # Generate summary
-            processed_data['summary'] = self._generate_summary(processed_data)
+            processed_data.summary = self._generate_summary(processed_data)
             
             return processed_data
             
@@ -62,6 +131,92 @@ class ExcelProcessor:
             logger.error(f"Error processing file {file_path}: {str(e)}")
             raise
     
+    def _sheet_keys(self, reader: WorkbookReader, sheet_names: List[str]) -> Dict[str, str]:
+        """Sheet cache keys of the sheets that have a fingerprint, by sheet name"""
+        if self.sheet_cache is None:
+            return {}
+        config = self.config_fingerprint()
+        keys = {}
+        with stage('fingerprint', sheets=len(sheet_names)):
+            for sheet_name in sheet_names:
+                fingerprint = reader.sheet_fingerprint(sheet_name)
+                if fingerprint is not None:
+                    keys[sheet_name] = self.sheet_cache.key(fingerprint, sheet_name, config)
+        return keys
+    
+    def _cached_sheets(self, keys: Dict[str, str]) -> Dict[str, Tuple[str, SheetResult]]:
+        """Results of the sheets found in the sheet cache, by sheet name"""
+        with stage('sheet_cache', sheets=len(keys)) as record:
+            try:
+                cached = self.sheet_cache.get_many(list(keys.values()))
+            except Exception as e:
+                # The cache only saves work; process every sheet instead
+                logger.warning(f"Sheet cache lookup failed: {str(e)}")
+                cached = {}
+            record['hits'] = len(cached)
+        return {name: cached[key] for name, key in keys.items() if key in cached}
+    
+    def _cache_sheets(self, keys: Dict[str, str], results: Dict[str, Tuple[str, SheetResult]]):
+        """Store freshly processed sheets in the sheet cache"""
+        try:
+            self.sheet_cache.put_many(
+                (keys[name], content_type, sheet_data) for name, (content_type, sheet_data) in results.items()
+            )
+        except Exception as e:
+            logger.warning(f"Sheet cache update failed: {str(e)}")
+    
+    def _process_sheet(self, sheet_df: pd.DataFrame, sheet_name: str) -> Tuple[str, SheetResult]:
+        """Clean, classify and process a single sheet"""
+        logger.info(f"Processing sheet: {sheet_name}")
+        
+        # Clean the dataframe
+        with stage('clean', rows=len(sheet_df), sheet=sheet_name):
+            cleaned_df = self._clean_dataframe(sheet_df)
+        
+        # Detect content type
+        with stage('classify', rows=len(cleaned_df), sheet=sheet_name):
+            content_type = self._detect_content_type(cleaned_df)
+        
+        # Process based on content type
+        with stage('extract', rows=len(cleaned_df), sheet=sheet_name, content_type=content_type):
+            if content_type == 'estimate':
+                return content_type, self._process_estimate(cleaned_df, sheet_name)
+            elif content_type == 'financial':
+                return content_type, self._process_financial_statement(cleaned_df, sheet_name)
+            else:
+                # Mixed or unknown content
+                return content_type, self._process_mixed_content(cleaned_df, sheet_name)
+    
+    def _add_sheet_result(self, processed_data: ProcessedWorkbook, sheet_name: str,
+                          content_type: str, sheet_data: SheetResult):
+        """Merge one processed sheet into the workbook result"""
+        if content_type == 'estimate':
+            processed_data.estimates.append(sheet_data)
+        elif content_type == 'financial':
+            processed_data.financial_statements.append(sheet_data)
+        else:
+            processed_data.sheets[sheet_name] = sheet_data
+    
+    def _use_parallel(self, sheet_count: int) -> bool:
+        """Whether a workbook is large enough to fan its sheets out to workers"""
+        return self._worker_count(sheet_count) > 1 and sheet_count >= self.parallel_min_sheets
+    
+    def _worker_count(self, sheet_count: int) -> int:
+        max_workers = self.max_workers if self.max_workers is not None else (os.cpu_count() or 1)
+        return max(1, min(max_workers, sheet_count))
+    
+    def _process_sheets_parallel(self, file_path: Path, sheet_names: List[str],
+                                 data: Optional[bytes] = None) -> List[Tuple[str, SheetResult]]:
+        """Process sheets on a worker pool, returning results in sheet order"""
+        workers = self._worker_count(len(sheet_names))
+        logger.info(f"Processing {len(sheet_names)} sheets on {workers} {self.executor} workers")
+        
+        executor_class = ProcessPoolExecutor if self.executor == 'process' else ThreadPoolExecutor
+        with executor_class(max_workers=workers, initializer=_init_sheet_worker,
+                            initargs=(self, file_path, data)) as executor:
+            # map() yields in submission order, so the merge is deterministic
+            return list(executor.map(_process_sheet_task, sheet_names))
+    
     def _clean_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
         """Clean and prepare dataframe for processing"""
         # Remove completely empty rows and columns
@@ -70,197 +225,188 @@ class ExcelProcessor:
         # Reset index
         df = df.reset_index(drop=True)
         
-        # Fill NaN values with empty strings
-        df = df.fillna('')
+        if not self.typed:
+            # Fill NaN values with empty strings
+            df = df.fillna('')
+            
+            # Convert all data to string for consistent processing
+            return df.astype(str)
         
-        # Convert all data to string for consistent processing
-        df = df.astype(str)
+        # Keep numeric columns as they are; only the remaining columns get a
+        # text view, with NaN shown as an empty string
+        df = df.copy()
+        for position in range(df.shape[1]):
+            column = df.iloc[:, position]
+            if is_numeric_column(column):
+                continue
+            numeric = self._as_numeric_column(column)
+            if numeric is not None:
+                df.isetitem(position, numeric)
+            else:
+                df.isetitem(position, column.fillna('').astype(str))
         
         return df
     
+    def _as_numeric_column(self, column: pd.Series):
+        """Convert an object column holding only numbers, or return None"""
+        values = column.dropna()
+        if values.empty:
+            return None
+        if not all(isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_))
+                   for value in values):
+            return None
+        return pd.to_numeric(column)
+    
+    def _text_columns(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Columns of the cleaned sheet that carry text"""
+        if not self.typed:
+            return df
+        keep = [not is_numeric_column(df.iloc[:, position]) for position in range(df.shape[1])]
+        return df.iloc[:, keep]
+    
+    def _payload_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Cell values as handed to the generators, with None for missing numbers"""
+        if not self.typed:
+            return df
+        return df.astype(object).where(df.notna(), None)
+    
     def _detect_content_type(self, df: pd.DataFrame) -> str:
         """Detect if content is estimate, financial statement, or mixed"""
-        # Get all text content
-        all_text = ' '.join(df.values.flatten()).lower()
-        
-        estimate_score = sum(1 for keyword in self.estimate_keywords if keyword in all_text)
-        financial_score = sum(1 for keyword in self.financial_keywords if keyword in all_text)
-        
-        if estimate_score > financial_score and estimate_score > 2:
-            return 'estimate'
-        elif financial_score > estimate_score and financial_score > 2:
-            return 'financial'
-        else:
-            return 'mixed'
+        # Only text cells are scanned; numeric cells cannot contain keywords
+        return self._get_classifier().classify(self._text_columns(df))
     
-    def _process_estimate(self, df: pd.DataFrame, sheet_name: str) -> Dict[str, Any]:
+    def _get_classifier(self) -> ContentClassifier:
+        """Classifier for the current keyword lists, rebuilt if they changed"""
+        keywords = (tuple(self.estimate_keywords), tuple(self.financial_keywords))
+        if self._classifier is None or self._classifier.keywords != keywords:
+            self._classifier = ContentClassifier(
+                self.estimate_keywords,
+                self.financial_keywords,
+                sample_rows=self.classifier_sample_rows,
+                confidence=self.classifier_confidence
+            )
+        return self._classifier
+    
+    def _process_estimate(self, df: pd.DataFrame, sheet_name: str) -> EstimateSheet:
         """Process estimate data"""
-        estimate_data = {
-            'sheet_name': sheet_name,
-            'title': f"Estimate - {sheet_name}",
-            'items': [],
-            'subtotals': [],
-            'total': 0,
-            'headers': []
-        }
-        
         # Find headers (usually first row with meaningful content)
         headers = self._find_headers(df)
-        estimate_data['headers'] = headers
-        
-        # Process data rows
-        for idx, row in df.iterrows():
-            if idx == 0:  # Skip header row
-                continue
-            
-            # Check if row contains numeric data
-            numeric_values = self._extract_numeric_values(row)
-            if numeric_values:
-                item = {
-                    'description': self._get_description(row),
-                    'quantity': self._get_quantity(row),
-                    'unit_price': self._get_unit_price(row),
-                    'total': self._get_total(row),
-                    'row_data': row.tolist()
-                }
-                estimate_data['items'].append(item)
         
-        # Calculate totals
-        estimate_data['total'] = sum(item['total'] for item in estimate_data['items'])
+        # Parse every cell once, then select the item rows of every column
+        # in bulk; rows without numbers and the header row 0 are skipped
+        values = self.extractor.extract(df)
+        item_rows = np.flatnonzero(values.has_values())
+        item_rows = item_rows[item_rows != 0]
+        items = EstimateItems(
+            description=self.extractor.descriptions(df)[item_rows],
+            quantity=values.quantity()[item_rows],
+            unit_price=values.unit_price()[item_rows],
+            total=values.total()[item_rows],
+            row_data=self._row_data(df, item_rows)
+        )
         
-        return estimate_data
+        return EstimateSheet(
+            sheet_name=sheet_name,
+            title=f"Estimate - {sheet_name}",
+            headers=headers,
+            items=items,
+            # Summed in item order, as the per-item loop did
+            total=sum(items.total.tolist())
+        )
     
-    def _process_financial_statement(self, df: pd.DataFrame, sheet_name: str) -> Dict[str, Any]:
+    def _process_financial_statement(self, df: pd.DataFrame, sheet_name: str) -> FinancialSheet:
         """Process financial statement data"""
-        financial_data = {
-            'sheet_name': sheet_name,
-            'title': f"Financial Statement - {sheet_name}",
-            'sections': [],
-            'headers': []
-        }
-        
         # Find headers
         headers = self._find_headers(df)
-        financial_data['headers'] = headers
         
-        # Group rows into sections
-        current_section = None
-        for idx, row in df.iterrows():
-            if idx == 0:  # Skip header row
-                continue
-            
-            # Check if this is a section header
-            if self._is_section_header(row):
-                if current_section:
-                    financial_data['sections'].append(current_section)
-                current_section = {
-                    'name': self._get_section_name(row),
-                    'items': []
-                }
-            else:
-                # Add item to current section
-                numeric_values = self._extract_numeric_values(row)
-                if numeric_values and current_section:
-                    item = {
-                        'description': self._get_description(row),
-                        'amount': self._get_amount(row),
-                        'row_data': row.tolist()
-                    }
-                    current_section['items'].append(item)
+        # Parse every cell once, then cut the rows into sections using the
+        # precomputed arrays
+        values = self.extractor.extract(df)
+        has_values = values.has_values()
+        amounts = values.amount()
+        descriptions = self.extractor.descriptions(df)
+        is_section_header = self.extractor.contains_any(df, self.section_keywords)
+        section_names = self.extractor.first_text(df, default="Section")
         
-        # Add last section
-        if current_section:
-            financial_data['sections'].append(current_section)
+        # Each section header starts a section running up to the next one;
+        # rows before the first header (and header row 0) belong to none
+        starts = np.flatnonzero(is_section_header[1:]) + 1
+        ends = np.append(starts[1:], len(df))
+        sections = []
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            item_rows = np.flatnonzero(has_values[start + 1:end]) + start + 1
+            sections.append(FinancialSection(
+                name=section_names[start],
+                items=FinancialItems(
+                    description=descriptions[item_rows],
+                    amount=amounts[item_rows],
+                    row_data=self._row_data(df, item_rows)
+                )
+            ))
         
-        return financial_data
+        return FinancialSheet(
+            sheet_name=sheet_name,
+            title=f"Financial Statement - {sheet_name}",
+            headers=headers,
+            sections=sections
+        )
     
-    def _process_mixed_content(self, df: pd.DataFrame, sheet_name: str) -> Dict[str, Any]:
+    def _process_mixed_content(self, df: pd.DataFrame, sheet_name: str) -> DataSheet:
         """Process mixed or unknown content"""
-        return {
-            'sheet_name': sheet_name,
-            'title': f"Data - {sheet_name}",
-            'data': df.to_dict('records'),
-            'headers': df.columns.tolist()
-        }
+        # The rows stay columnar; ExcelGenerator appends them straight from
+        # the frame instead of going through one dict per row
+        return DataSheet(
+            sheet_name=sheet_name,
+            title=f"Data - {sheet_name}",
+            headers=df.columns.tolist(),
+            data=self._payload_frame(df)
+        )
+    
+    def _row_data(self, df: pd.DataFrame, item_rows: np.ndarray) -> Optional[np.ndarray]:
+        """Source rows of the given items, if row payloads are retained"""
+        if not self.keep_row_data:
+            return None
+        return self._payload_frame(df.iloc[item_rows]).to_numpy()
     
     def _find_headers(self, df: pd.DataFrame) -> List[str]:
         """Find column headers"""
         # Try first row
         first_row = df.iloc[0].tolist()
-        if any(str(cell).strip() for cell in first_row):
-            return [str(cell).strip() for cell in first_row]
+        if any(self._cell_text(cell) for cell in first_row):
+            return [self._cell_text(cell) for cell in first_row]
         
         # Use column names as fallback
         return df.columns.tolist()
     
-    def _extract_numeric_values(self, row: pd.Series) -> List[float]:
-        """Extract numeric values from a row"""
-        numeric_values = []
-        for cell in row:
-            if isinstance(cell, (int, float)) and not pd.isna(cell):
-                numeric_values.append(float(cell))
-            elif isinstance(cell, str):
-                # Try to extract numbers from strings
-                numbers = re.findall(r'-?\d+\.?\d*', cell)
-                numeric_values.extend([float(n) for n in numbers])
-        return numeric_values
+    def _cell_text(self, cell: Any) -> str:
+        """Stripped text of a cell, empty for missing values"""
+        if not isinstance(cell, str) and pd.isna(cell):
+            return ''
+        return str(cell).strip()
     
-    def _get_description(self, row: pd.Series) -> str:
-        """Extract description from row (usually first non-numeric column)"""
-        for cell in row:
-            if isinstance(cell, str) and cell.strip() and not re.match(r'^-?\d+\.?\d*$', cell.strip()):
-                return cell.strip()
-        return "Item"
-    
-    def _get_quantity(self, row: pd.Series) -> float:
-        """Extract quantity from row"""
-        numeric_values = self._extract_numeric_values(row)
-        return numeric_values[0] if numeric_values else 1.0
-    
-    def _get_unit_price(self, row: pd.Series) -> float:
-        """Extract unit price from row"""
-        numeric_values = self._extract_numeric_values(row)
-        return numeric_values[1] if len(numeric_values) > 1 else 0.0
-    
-    def _get_total(self, row: pd.Series) -> float:
-        """Extract total from row"""
-        numeric_values = self._extract_numeric_values(row)
-        if len(numeric_values) >= 3:
-            return numeric_values[2]
-        elif len(numeric_values) == 2:
-            return numeric_values[0] * numeric_values[1]
-        else:
-            return numeric_values[0] if numeric_values else 0.0
-    
-    def _get_amount(self, row: pd.Series) -> float:
-        """Extract amount from row"""
-        numeric_values = self._extract_numeric_values(row)
-        return numeric_values[-1] if numeric_values else 0.0
-    
-    def _is_section_header(self, row: pd.Series) -> bool:
-        """Check if row is a section header"""
-        # Look for patterns that indicate section headers
-        text_content = ' '.join(str(cell) for cell in row).lower()
-        return any(keyword in text_content for keyword in ['total', 'subtotal', 'summary', 'section'])
-    
-    def _get_section_name(self, row: pd.Series) -> str:
-        """Extract section name from row"""
-        for cell in row:
-            if isinstance(cell, str) and cell.strip():
-                return cell.strip()
-        return "Section"
-    
-    def _generate_summary(self, processed_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _generate_summary(self, processed_data: ProcessedWorkbook) -> Summary:
         """Generate summary statistics"""
-        summary = {
-            'total_estimates': len(processed_data['estimates']),
-            'total_financial_statements': len(processed_data['financial_statements']),
-            'total_sheets': len(processed_data['sheets']),
-            'grand_total': 0
-        }
-        
-        # Calculate grand total from estimates
-        for estimate in processed_data['estimates']:
-            summary['grand_total'] += estimate['total']
+        # Grand total is the sum of the estimate totals
+        grand_total = 0
+        for estimate in processed_data.estimates:
+            grand_total += estimate.total
         
-        return summary
+        return Summary(
+            total_estimates=len(processed_data.estimates),
+            total_financial_statements=len(processed_data.financial_statements),
+            total_sheets=len(processed_data.sheets),
+            grand_total=grand_total
+        )
+
+
+# Per-worker state for parallel sheet processing: each worker opens the
+# workbook once and reads only the sheets it is handed
+_worker_state = threading.local()
+
+def _init_sheet_worker(processor: ExcelProcessor, file_path: Path, data: Optional[bytes]):
+    _worker_state.processor = processor
+    _worker_state.reader = WorkbookReader(file_path, data)
+
+def _process_sheet_task(sheet_name: str) -> Tuple[str, SheetResult]:
+    sheet_df = _worker_state.reader.read_sheet(sheet_name)
+    return _worker_state.processor._process_sheet(sheet_df, sheet_name)
@@ -0,0 +1,154 @@
+import cProfile
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import logging
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+PROFILERS = ('cprofile', 'pyinstrument')
+PROFILE_SUFFIXES = {'cprofile': '.prof', 'pyinstrument': '.html'}
+
+Record = Dict[str, Any]
+
+
+class StageRecorder:
+    """Wall time, CPU time, rows and peak memory of named pipeline stages.
+
+    Records are plain dicts in the order the stages started, e.g.
+    ``{'stage': 'clean', 'sheet': 'Q1', 'rows': 120, 'wall_s': 0.004,
+    'cpu_s': 0.004, 'peak_rss_mb': 81.2}``. CPU time is that of the
+    calling thread; peak memory is the process' resident high-water mark
+    when the stage ended.
+
+    When ``profile_dir`` is set, each stage run on a worker through
+    run_pipeline_async is also profiled, with ``profiler``, into a file
+    named after ``name`` and the stage.
+    """
+
+    def __init__(self, name: str = '', profile_dir: Optional[Path] = None, profiler: str = 'cprofile'):
+        if profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler: {profiler}")
+        self.name = name
+        self.profile_dir = Path(profile_dir) if profile_dir is not None else None
+        self.profiler = profiler
+        self.records: List[Record] = []
+
+    @contextmanager
+    def stage(self, name: str, rows: Optional[int] = None, **labels: Any) -> Iterator[Record]:
+        """Record the enclosed block; the yielded record can be updated, e.g. with ``rows``"""
+        record = {'stage': name, **labels}
+        if rows is not None:
+            record['rows'] = rows
+        self.records.append(record)
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = round(time.perf_counter() - wall, 6)
+            record['cpu_s'] = round(time.thread_time() - cpu, 6)
+            record['peak_rss_mb'] = peak_rss_mb()
+
+    def profile_path(self, stage: str) -> Optional[Path]:
+        """Where to write the profile of ``stage``, or None when not profiling"""
+        if self.profile_dir is None:
+            return None
+        return self.profile_dir / f"{self.name}_{stage}{PROFILE_SUFFIXES[self.profiler]}"
+
+
+# Recorder that stage() reports to on the current thread, if any
+_active = threading.local()
+
+
+def stage(name: str, rows: Optional[int] = None, **labels: Any):
+    """Record a block in the active recorder; does nothing when none is active"""
+    recorder = getattr(_active, 'recorder', None)
+    if recorder is None:
+        # A throwaway record, so callers can update it either way
+        return nullcontext({'stage': name, 'rows': rows, **labels})
+    return recorder.stage(name, rows, **labels)
+
+
+@contextmanager
+def recording(recorder: StageRecorder):
+    """Make ``recorder`` the active one on this thread for the enclosed block"""
+    previous = getattr(_active, 'recorder', None)
+    _active.recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _active.recorder = previous
+
+
+def run_instrumented(name: str, fn: Callable, args: Sequence[Any], profile_path: Optional[Path] = None,
+                     profiler: str = 'cprofile') -> Tuple[Any, List[Record]]:
+    """Call ``fn(*args)`` as stage ``name`` and return its result with the stage records.
+
+    Meant to run on a pool worker, so the records of the stages inside
+    ``fn`` travel back to the request with the result.
+    """
+    reset_peak_rss()
+    recorder = StageRecorder()
+    with recording(recorder), recorder.stage(name), _profiling(profile_path, profiler):
+        result = fn(*args)
+    return result, recorder.records
+
+
+def run_timed(fn: Callable, args: Sequence[Any]) -> Tuple[Any, float]:
+    """Call ``fn(*args)`` and return its result with the seconds it took"""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+@contextmanager
+def _profiling(path: Optional[Path], profiler: str):
+    if path is None:
+        yield
+        return
+
+    if profiler == 'pyinstrument':
+        from pyinstrument import Profiler
+        profile = Profiler()
+        profile.start()
+        try:
+            yield
+        finally:
+            profile.stop()
+            path.write_text(profile.output_html())
+    else:
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(path)
+    logger.info(f"Profile written to {path}")
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Resident memory high-water mark of this process, in MiB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 ** 2 if sys.platform == 'darwin' else 1024), 1)
+
+
+def reset_peak_rss():
+    """Restart the high-water mark at the current usage, where the OS allows it (Linux)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
@@ -0,0 +1,265 @@
+import asyncio
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import logging
+from pipeline import OUTPUT_FORMATS
+from result_cache import ResultCache, file_digest
+from worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobStore:
+    """SQLite-backed job table.
+
+    Every call opens its own short-lived connection, so the store can be
+    shared by several API processes and survives restarts. Running jobs
+    carry a heartbeat refreshed by the process running them; a job whose
+    heartbeat stops was cut off and can be queued again.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    original_filename TEXT NOT NULL,
+                    upload_path TEXT NOT NULL,
+                    stages TEXT NOT NULL,
+                    pdf_filename TEXT,
+                    excel_filename TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    heartbeat_at REAL
+                )
+            """)
+            # Stores created before heartbeats were recorded
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'heartbeat_at' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, job_id: str, original_filename: str, upload_path: Path,
+               formats: Sequence[str] = OUTPUT_FORMATS) -> Dict[str, Any]:
+        """Register a new queued job producing the given output formats"""
+        now = time.time()
+        stages = {stage: 'pending' for stage in ('process', *formats)}
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO jobs (id, state, original_filename, upload_path, stages, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, original_filename, str(upload_path), json.dumps(stages), now, now)
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job record, or None if unknown"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['stages'] = json.loads(job['stages'])
+        return job
+
+    def claim_queued(self, limit: int) -> List[Dict[str, Any]]:
+        """Mark up to ``limit`` of the oldest queued jobs running and return them"""
+        if limit <= 0:
+            return []
+        with closing(self._connect()) as conn, conn:
+            # Take the write lock before reading, so two processes never
+            # claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE state = ? ORDER BY created_at LIMIT ?", (QUEUED, limit)
+            ).fetchall()
+            job_ids = [row['id'] for row in rows]
+            now = time.time()
+            conn.executemany(
+                "UPDATE jobs SET state = ?, updated_at = ?, heartbeat_at = ? WHERE id = ? AND state = ?",
+                [(RUNNING, now, now, job_id, QUEUED) for job_id in job_ids]
+            )
+        return [self.get(job_id) for job_id in job_ids]
+
+    def set_stage(self, job_id: str, stage: str, status: str):
+        """Record the progress of one pipeline stage"""
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            stages = json.loads(row['stages'])
+            stages[stage] = status
+            conn.execute(
+                "UPDATE jobs SET stages = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(stages), time.time(), job_id)
+            )
+
+    def finish(self, job_id: str, pdf_filename: Optional[str], excel_filename: Optional[str]):
+        """Mark a job done with its output files, None for formats not produced"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, pdf_filename = ?, excel_filename = ?, updated_at = ? WHERE id = ?",
+                (DONE, pdf_filename, excel_filename, time.time(), job_id)
+            )
+
+    def fail(self, job_id: str, error: str):
+        """Mark a job failed"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE id = ?",
+                (FAILED, error, time.time(), job_id)
+            )
+
+    def count(self, state: str) -> int:
+        """Number of jobs in ``state``"""
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (state,)).fetchone()[0]
+
+    def heartbeat(self, job_ids: Sequence[str]):
+        """Record that the running jobs ``job_ids`` are still being processed"""
+        if not job_ids:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND state = ?",
+                [(time.time(), job_id, RUNNING) for job_id in job_ids]
+            )
+
+    def requeue_stale(self, max_age: float) -> int:
+        """Put running jobs without a heartbeat for ``max_age`` seconds back in the queue"""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = ?, updated_at = ? "
+                "WHERE state = ? AND COALESCE(heartbeat_at, updated_at) < ?",
+                (QUEUED, now, RUNNING, now - max_age)
+            )
+            return cursor.rowcount
+
+
+class JobScheduler:
+    """Background loop feeding queued jobs from the store to the worker pool.
+
+    Submissions never block or get rejected; they wait in the store until
+    one of ``max_concurrent`` job slots is free. A running job then holds
+    a pool slot, waiting for a free worker to get one. Store calls run on
+    a thread of their own, off the event loop and in the order made.
+
+    Every poll refreshes the heartbeat of this scheduler's running jobs
+    and requeues jobs whose heartbeat is older than ``stale_after``
+    seconds, whichever process ran them, so jobs cut off by a crash or
+    restart resume without taking over those of live processes.
+    """
+
+    def __init__(self, store: JobStore, pool: WorkerPool, cache: ResultCache,
+                 max_concurrent: int, poll_interval: float = 1.0, stale_after: float = 60.0):
+        self.store = store
+        self.pool = pool
+        self.cache = cache
+        self.max_concurrent = max_concurrent
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._wakeup = asyncio.Event()
+        # Running job tasks and the ids of their jobs
+        self._running: Dict[asyncio.Task, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._store_thread: Optional[ThreadPoolExecutor] = None
+
+    def start(self):
+        """Start the scheduling loop"""
+        self._store_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='job-store')
+        self._task = asyncio.create_task(self._loop())
+
+    async def _store_call(self, fn: Callable, *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._store_thread, partial(fn, *args))
+
+    def _report_stage(self, job_id: str, stage: str, status: str):
+        """Progress callback: record the stage without waiting for the store"""
+        self._store_thread.submit(self.store.set_stage, job_id, stage, status)
+
+    async def stop(self):
+        """Stop scheduling and wait for running jobs"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        if self._store_thread is not None:
+            self._store_thread.shutdown(wait=True)
+            self._store_thread = None
+
+    @property
+    def running(self) -> int:
+        """Jobs currently being processed"""
+        return len(self._running)
+
+    def wake(self):
+        """Check the queue now instead of at the next poll"""
+        self._wakeup.set()
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            await self._store_call(self.store.heartbeat, list(self._running.values()))
+            requeued = await self._store_call(self.store.requeue_stale, self.stale_after)
+            if requeued:
+                logger.info(f"Requeued {requeued} interrupted jobs")
+            for job in await self._store_call(self.store.claim_queued, self.max_concurrent - len(self._running)):
+                task = asyncio.create_task(self._run(job))
+                self._running[task] = job['id']
+                task.add_done_callback(lambda task: self._running.pop(task, None))
+
+    async def _run(self, job: Dict[str, Any]):
+        job_id = job['id']
+        upload_path = Path(job['upload_path'])
+        formats = [fmt for fmt in OUTPUT_FORMATS if fmt in job['stages']]
+        try:
+            loop = asyncio.get_running_loop()
+            content_hash = await loop.run_in_executor(None, file_digest, upload_path)
+            # Counted by the pool like an upload, but waiting for a free
+            # worker instead of being refused
+            async with self.pool.slot(wait=True):
+                filenames = await self.cache.get_or_render(
+                    self.pool, upload_path, content_hash, formats,
+                    progress=partial(self._report_stage, job_id)
+                )
+            await self._store_call(self.store.finish, job_id, filenames.get('pdf'), filenames.get('excel'))
+            logger.info(f"Job {job_id} finished")
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            await self._store_call(self.store.fail, job_id, str(e))
+        finally:
+            if upload_path.exists():
+                upload_path.unlink()
+            self.wake()
@@ -1,21 +1,149 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Match
+from contextlib import asynccontextmanager
+from functools import partial
 import pandas as pd
+import asyncio
+import json
 import os
+import time
 import uuid
 from pathlib import Path
-from typing import List
+from typing import AsyncIterator, List, Tuple
 import logging
-from excel_processor import ExcelProcessor
-from pdf_generator import PDFGenerator
-from excel_generator import ExcelGenerator
+from pipeline import OUTPUT_FORMATS, init_worker, parse_formats, process_workbook, run_stage
+from worker_pool import WorkerPool, PoolSaturatedError
+from jobs import JobStore, JobScheduler, QUEUED, DONE, FAILED
+from result_cache import ResultCache
+from sheet_cache import SheetCache
+from workbook_reader import SheetSelectionError
+from upload_stream import save_upload, UploadTooLargeError
+from batch import BatchError, save_batch, run_batch
+from instrumentation import StageRecorder, PROFILERS
+from metrics import REGISTRY, CONTENT_TYPE, Counter, Gauge, Histogram
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Excel Financial Processor", version="1.0.0")
+# Worker pool for the CPU-bound processing and rendering
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", "0")) or None  # default: CPU count
+WORKER_QUEUE_DEPTH = int(os.environ.get("WORKER_QUEUE_DEPTH", "8"))
+WORKER_RETRY_AFTER = int(os.environ.get("WORKER_RETRY_AFTER", "5"))  # seconds, sent with 503
+
+# Processed sheets, shared by the workers so that re-uploads only process
+# the sheets that changed; SHEET_CACHE_MAX_BYTES=0 turns this off
+SHEET_CACHE_DB_PATH = Path(os.environ.get("SHEET_CACHE_DB_PATH", "sheet_cache.db"))
+SHEET_CACHE_MAX_BYTES = int(os.environ.get("SHEET_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+SHEET_CACHE_MAX_AGE = float(os.environ.get("SHEET_CACHE_MAX_AGE", str(7 * 24 * 3600)))  # seconds
+
+sheet_cache = (SheetCache(SHEET_CACHE_DB_PATH, SHEET_CACHE_MAX_BYTES, SHEET_CACHE_MAX_AGE)
+               if SHEET_CACHE_MAX_BYTES > 0 else None)
+
+# Each worker builds its processor and renderers once, when it starts
+worker_pool = WorkerPool(max_workers=WORKER_PROCESSES, max_queue=WORKER_QUEUE_DEPTH,
+                         initializer=partial(init_worker, sheet_cache))
+
+# Create uploads and outputs directories
+UPLOAD_DIR = Path("uploads")
+OUTPUT_DIR = Path("outputs")
+UPLOAD_DIR.mkdir(exist_ok=True)
+OUTPUT_DIR.mkdir(exist_ok=True)
+
+# Uploads are streamed to disk; small ones are kept in memory instead
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(10 * 1024 ** 2)))
+IN_MEMORY_UPLOAD_BYTES = int(os.environ.get("IN_MEMORY_UPLOAD_BYTES", str(1024 ** 2)))
+
+# Rendered outputs, cached by workbook content hash
+RESULT_CACHE_DB_PATH = Path(os.environ.get("RESULT_CACHE_DB_PATH", "result_cache.db"))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(1024 ** 3)))
+RESULT_CACHE_MAX_AGE = float(os.environ.get("RESULT_CACHE_MAX_AGE", str(7 * 24 * 3600)))  # seconds
+
+result_cache = ResultCache(RESULT_CACHE_DB_PATH, OUTPUT_DIR, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_MAX_AGE)
+
+# Background jobs: persisted in SQLite and run on the worker pool
+JOB_DB_PATH = Path(os.environ.get("JOB_DB_PATH", "jobs.db"))
+JOB_MAX_CONCURRENT = int(os.environ.get("JOB_MAX_CONCURRENT", "0")) or worker_pool.max_workers
+JOB_STALE_AFTER = float(os.environ.get("JOB_STALE_AFTER", "60"))  # seconds without a heartbeat
+
+# Batches: workbooks and total bytes after unpacking zip archives, and how
+# many of their files are in the pipeline at once
+BATCH_MAX_FILES = int(os.environ.get("BATCH_MAX_FILES", "500"))
+BATCH_MAX_BYTES = int(os.environ.get("BATCH_MAX_BYTES", str(1024 ** 3)))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "0")) or worker_pool.max_workers
+
+# Profiles of /upload?debug=true requests are written here when set
+PROFILE_DIR = Path(os.environ["PROFILE_DIR"]) if os.environ.get("PROFILE_DIR") else None
+PROFILER = os.environ.get("PROFILER", "cprofile")  # cprofile or pyinstrument
+if PROFILER not in PROFILERS:
+    raise ValueError(f"PROFILER must be one of {', '.join(PROFILERS)}")
+if PROFILE_DIR is not None:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+
+job_store = JobStore(JOB_DB_PATH)
+job_scheduler = JobScheduler(job_store, worker_pool, result_cache, max_concurrent=JOB_MAX_CONCURRENT,
+                             stale_after=JOB_STALE_AFTER)
+
+# Metrics served at /metrics; pipeline stage metrics live in pipeline.py
+REQUESTS = Counter('http_requests_total', 'HTTP requests answered', ['method', 'handler', 'status'])
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Time to answer HTTP requests', ['handler'])
+REQUEST_BYTES = Counter('http_request_bytes_total', 'Request body bytes received', ['handler'])
+RESPONSE_BYTES = Counter('http_response_bytes_total', 'Response body bytes sent', ['handler'])
+UPLOADS_IN_FLIGHT = Gauge('excel_processor_uploads_in_flight', 'Uploads being received or processed')
+Gauge('excel_processor_workers', 'Worker processes', fn=lambda: worker_pool.max_workers)
+Gauge('excel_processor_worker_slots_used', 'Uploads holding a worker slot, running or queued',
+      fn=lambda: worker_pool.active)
+Gauge('excel_processor_worker_queue_depth', 'Uploads waiting for a free worker', fn=lambda: worker_pool.queued)
+Gauge('excel_processor_worker_waiting', 'Batch files and jobs waiting for a free worker',
+      fn=lambda: worker_pool.waiting)
+Gauge('excel_processor_worker_queue_capacity', 'Uploads allowed to wait for a free worker',
+      fn=lambda: worker_pool.max_queue)
+Counter('excel_processor_cache_hits_total', 'Outputs served from the result cache', fn=lambda: result_cache.hits)
+Counter('excel_processor_cache_misses_total', 'Outputs that had to be rendered', fn=lambda: result_cache.misses)
+Counter('excel_processor_cache_evictions_total', 'Cached outputs evicted', fn=lambda: result_cache.evictions)
+Gauge('excel_processor_cache_hit_ratio', 'Share of outputs served from the result cache',
+      fn=lambda: result_cache.hit_ratio)
+Gauge('excel_processor_cache_bytes', 'Size of the cached outputs', fn=lambda: result_cache.stats()['bytes'])
+if sheet_cache is not None:
+    Gauge('excel_processor_sheet_cache_bytes', 'Size of the cached processed sheets',
+          fn=lambda: sheet_cache.stats()['bytes'])
+Gauge('excel_processor_jobs_queued', 'Background jobs waiting for a job slot', fn=lambda: job_store.count(QUEUED))
+Gauge('excel_processor_jobs_running', 'Background jobs being processed', fn=lambda: job_scheduler.running)
+
+# Endpoints that receive workbooks, counted in UPLOADS_IN_FLIGHT
+UPLOAD_PATHS = ('/upload', '/jobs', '/batch')
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    worker_pool.start()
+    job_scheduler.start()
+    yield
+    await job_scheduler.stop()
+    worker_pool.shutdown()
+
+app = FastAPI(title="Excel Financial Processor", version="1.0.0", lifespan=lifespan)
+
+# Single-file uploads, and the room left around the file for the multipart
+# boundary and part headers
+SINGLE_UPLOAD_PATHS = ('/upload', '/jobs')
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+# Registered before CORS and metrics, so their middleware still wraps the 413
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Answer 413 from Content-Length before a single-file upload is received
+
+    The form parser reads the whole body before an endpoint runs, so the
+    size checks there only apply to bodies without a Content-Length.
+    """
+    if request.method == 'POST' and request.url.path in SINGLE_UPLOAD_PATHS:
+        declared = request.headers.get('content-length', '')
+        if declared.isdigit() and int(declared) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+            logger.warning(f"Rejecting upload of {declared} bytes from its Content-Length")
+            return JSONResponse(status_code=413, content={"detail": upload_too_large().detail})
+    return await call_next(request)
 
 # Configure CORS
 app.add_middleware(
@@ -26,66 +154,161 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create uploads and outputs directories
-UPLOAD_DIR = Path("uploads")
-OUTPUT_DIR = Path("outputs")
-UPLOAD_DIR.mkdir(exist_ok=True)
-OUTPUT_DIR.mkdir(exist_ok=True)
+def route_template(request: Request) -> str:
+    """Path template of the route serving ``request``, to keep metric labels bounded"""
+    for route in app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return 'unmatched'
+
+async def count_streamed_bytes(body: AsyncIterator[bytes], handler: str, upload: bool) -> AsyncIterator[bytes]:
+    """Pass a response body through, recording its size once it has been sent"""
+    size = 0
+    try:
+        async for chunk in body:
+            size += len(chunk)
+            yield chunk
+    finally:
+        RESPONSE_BYTES.inc(size, handler=handler)
+        if upload:
+            UPLOADS_IN_FLIGHT.dec()
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count, time and size every request for /metrics"""
+    handler = route_template(request)
+    upload = request.method == 'POST' and request.url.path in UPLOAD_PATHS
+    if upload:
+        UPLOADS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    streaming = False
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if 'content-length' in response.headers:
+            RESPONSE_BYTES.inc(int(response.headers['content-length']), handler=handler)
+        else:
+            # Streamed bodies (e.g. /batch) are still being produced; count
+            # them, and keep the upload in flight, until the stream ends
+            response.body_iterator = count_streamed_bytes(response.body_iterator, handler, upload)
+            streaming = True
+        return response
+    finally:
+        if upload and not streaming:
+            UPLOADS_IN_FLIGHT.dec()
+        REQUEST_SECONDS.observe(time.perf_counter() - start, handler=handler)
+        REQUESTS.inc(method=request.method, handler=handler, status=str(status))
+        REQUEST_BYTES.inc(int(request.headers.get('content-length', 0)), handler=handler)
+
+def query_formats(formats: str) -> Tuple[str, ...]:
+    """Pipeline formats for a ?formats= value"""
+    try:
+        return parse_formats(formats)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def check_upload_size(file: UploadFile):
+    """Refuse uploads the form parser already found too large, before copying them"""
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise UploadTooLargeError(f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+
+def upload_too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File too large, the limit is {MAX_UPLOAD_BYTES} bytes")
+
+def server_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy, please retry shortly",
+        headers={"Retry-After": str(WORKER_RETRY_AFTER)}
+    )
+
+def download_links(filenames: dict) -> dict:
+    """``pdf_download`` / ``excel_download`` response fields"""
+    return {f"{fmt}_download": f"/download/{filename}" for fmt, filename in filenames.items()}
 
 @app.get("/")
 async def root():
     return {"message": "Excel Financial Processor API"}
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...),
+                      formats: str = Query("pdf,excel", description="Comma-separated output formats: pdf, excel"),
+                      debug: bool = Query(False, description="Include per-stage timings in the response"),
+                      sheets: List[str] = Query([], description="Sheet names or patterns such as Q*; repeat for more"),
+                      summary_only: bool = Query(False, description="Return the summary instead of rendering outputs")):
     """Upload and process Excel file"""
     try:
         # Validate file type
         if not file.filename.endswith(('.xlsx', '.xls')):
             raise HTTPException(status_code=400, detail="Only Excel files (.xlsx, .xls) are allowed")
+        requested_formats = query_formats(formats)
+        check_upload_size(file)
         
-        # Generate unique filename
-        file_id = str(uuid.uuid4())
-        file_extension = Path(file.filename).suffix
-        upload_filename = f"{file_id}{file_extension}"
-        upload_path = UPLOAD_DIR / upload_filename
-        
-        # Save uploaded file
-        with open(upload_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        logger.info(f"File uploaded: {upload_filename}")
-        
-        # Process the Excel file
-        processor = ExcelProcessor()
-        processed_data = processor.process_file(upload_path)
-        
-        # Generate outputs
-        pdf_generator = PDFGenerator()
-        excel_generator = ExcelGenerator()
-        
-        # Generate PDF
-        pdf_filename = f"{file_id}_processed.pdf"
-        pdf_path = OUTPUT_DIR / pdf_filename
-        pdf_generator.generate_pdf(processed_data, pdf_path)
-        
-        # Generate Excel
-        excel_filename = f"{file_id}_processed.xlsx"
-        excel_path = OUTPUT_DIR / excel_filename
-        excel_generator.generate_excel(processed_data, excel_path)
+        async with worker_pool.slot():
+            # Generate unique filename
+            file_id = str(uuid.uuid4())
+            file_extension = Path(file.filename).suffix
+            upload_filename = f"{file_id}{file_extension}"
+            upload_path = UPLOAD_DIR / upload_filename
+            recorder = StageRecorder(file_id, PROFILE_DIR, PROFILER)
+            
+            # Stream the upload to disk in chunks, hashing it on the way;
+            # small files stay in memory and skip the disk round trip
+            with recorder.stage('upload') as record:
+                upload = await save_upload(file, upload_path, MAX_UPLOAD_BYTES, IN_MEMORY_UPLOAD_BYTES)
+                record['bytes'] = upload.size
+            
+            logger.info(f"File uploaded: {upload_filename} ({upload.size} bytes)")
+            
+            # Only the selected sheets are read; with summary_only nothing is
+            # rendered and the summary of those sheets is the whole answer
+            if summary_only:
+                with recorder.stage('summary'):
+                    processed_data = await run_stage(
+                        worker_pool, 'process', process_workbook, upload_path, upload.data, sheets or None,
+                        recorder=recorder if debug else None
+                    )
+                fields = {"summary": processed_data.summary.to_dict()}
+            else:
+                # Reuse outputs of an identical earlier upload; anything missing is
+                # processed on a worker and rendered concurrently on separate
+                # workers, so the event loop stays free for other requests. With
+                # debug set, the workers also time (and maybe profile) each stage
+                with recorder.stage('outputs', formats=list(requested_formats)):
+                    filenames = await result_cache.get_or_render(
+                        worker_pool, upload_path, upload.content_hash, requested_formats, data=upload.data,
+                        recorder=recorder if debug else None, sheets=sheets or None
+                    )
+                fields = download_links(filenames)
         
         # Clean up uploaded file
-        os.remove(upload_path)
+        if upload_path.exists():
+            os.remove(upload_path)
         
-        return {
+        response = {
             "file_id": file_id,
             "original_filename": file.filename,
-            "pdf_download": f"/download/{pdf_filename}",
-            "excel_download": f"/download/{excel_filename}",
+            **fields,
             "status": "success"
         }
+        if debug:
+            response["timings"] = recorder.records
+        return response
         
+    except UploadTooLargeError as e:
+        logger.warning(f"Rejecting upload: {str(e)}")
+        raise upload_too_large()
+    except PoolSaturatedError as e:
+        logger.warning(f"Rejecting upload: {str(e)}")
+        raise server_busy()
+    except HTTPException:
+        raise
+    except SheetSelectionError as e:
+        if upload_path.exists():
+            os.remove(upload_path)
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing file: {str(e)}")
         # Clean up uploaded file if it exists
@@ -93,6 +316,102 @@ async def upload_file(file: UploadFile = File(...)):
             os.remove(upload_path)
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
+@app.post("/batch")
+async def upload_batch(files: List[UploadFile] = File(...),
+                       formats: str = Query("pdf,excel", description="Comma-separated output formats: pdf, excel"),
+                       combined: bool = Query(False, description="Also render one PDF/XLSX across all files")):
+    """Process many Excel files or zip archives, streaming NDJSON results as files finish"""
+    requested_formats = query_formats(formats)
+    batch_id = str(uuid.uuid4())
+    
+    # Every file takes a worker slot of its own while it is processed,
+    # waiting for a free worker rather than being refused
+    try:
+        saved = await save_batch(files, UPLOAD_DIR, batch_id, MAX_UPLOAD_BYTES, BATCH_MAX_FILES, BATCH_MAX_BYTES)
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UploadTooLargeError as e:
+        logger.warning(f"Rejecting batch: {str(e)}")
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error saving batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error saving batch: {str(e)}")
+    
+    logger.info(f"Batch {batch_id}: {len(saved)} files")
+    
+    async def results():
+        try:
+            async for line in run_batch(worker_pool, result_cache, saved, requested_formats,
+                                        BATCH_CONCURRENCY, combined=combined):
+                if 'outputs' in line:
+                    line.update(download_links(line.pop('outputs')))
+                yield json.dumps(line) + "\n"
+        finally:
+            for file in saved:
+                if file.path.exists():
+                    os.remove(file.path)
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...),
+                     formats: str = Query("pdf,excel", description="Comma-separated output formats: pdf, excel")):
+    """Queue an Excel file for background processing"""
+    if not file.filename.endswith(('.xlsx', '.xls')):
+        raise HTTPException(status_code=400, detail="Only Excel files (.xlsx, .xls) are allowed")
+    requested_formats = query_formats(formats)
+    
+    job_id = str(uuid.uuid4())
+    upload_path = UPLOAD_DIR / f"{job_id}{Path(file.filename).suffix}"
+    try:
+        # Jobs outlive the request, so the upload always goes to disk
+        check_upload_size(file)
+        await save_upload(file, upload_path, MAX_UPLOAD_BYTES)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, job_store.create, job_id, file.filename, upload_path, requested_formats)
+    except UploadTooLargeError as e:
+        logger.warning(f"Rejecting job: {str(e)}")
+        raise upload_too_large()
+    except Exception as e:
+        logger.error(f"Error queueing job: {str(e)}")
+        if upload_path.exists():
+            os.remove(upload_path)
+        raise HTTPException(status_code=500, detail=f"Error queueing job: {str(e)}")
+    
+    logger.info(f"Job {job_id} queued for {file.filename}")
+    job_scheduler.wake()
+    
+    return {
+        "job_id": job_id,
+        "original_filename": file.filename,
+        "state": "queued",
+        "status_url": f"/jobs/{job_id}"
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Report the state and per-stage progress of a job"""
+    loop = asyncio.get_running_loop()
+    job = await loop.run_in_executor(None, job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    response = {
+        "job_id": job['id'],
+        "original_filename": job['original_filename'],
+        "state": job['state'],
+        "stages": job['stages'],
+        "created_at": job['created_at'],
+        "updated_at": job['updated_at']
+    }
+    if job['state'] == DONE:
+        response.update(download_links({
+            fmt: job[f"{fmt}_filename"] for fmt in OUTPUT_FORMATS if job[f"{fmt}_filename"]
+        }))
+    elif job['state'] == FAILED:
+        response["error"] = job['error']
+    return response
+
 @app.get("/download/{filename}")
 async def download_file(filename: str):
     """Download generated file"""
@@ -115,6 +434,25 @@ async def download_file(filename: str):
         media_type=media_type
     )
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Result cache size and hit/miss counts, and the size of the sheet cache"""
+    def collect():
+        stats = result_cache.stats()
+        stats['sheets'] = sheet_cache.stats() if sheet_cache is not None else None
+        return stats
+    
+    # Both caches are queried in SQLite; keep that off the event loop
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, collect)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of the request, pipeline, cache and worker metrics"""
+    # Some gauges read the caches and job store from SQLite
+    loop = asyncio.get_running_loop()
+    return Response(await loop.run_in_executor(None, REGISTRY.render), media_type=CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
@@ -0,0 +1,203 @@
+import math
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Starlette's Response appends the charset
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+# Seconds; covers a small sheet up to a workbook near the processing timeout
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class Registry:
+    """Metrics of this process, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: List['Metric'] = []
+        self._names = set()
+
+    def register(self, metric: 'Metric'):
+        if metric.name in self._names:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._names.add(metric.name)
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Exposition of every metric, for a ``/metrics`` endpoint"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                # One broken callback must not take the whole scrape down
+                logger.error(f"Error collecting {metric.name}: {str(e)}")
+                continue
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    """Base of the metric types: a name, help text and optional labels.
+
+    Metrics without labels are updated directly; labelled ones take the
+    label values as keyword arguments, e.g. ``counter.inc(stage='pdf')``.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Total that only goes up, e.g. requests served.
+
+    ``fn`` makes an unlabelled counter read its total from elsewhere at
+    scrape time, for totals another object already keeps.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 fn: Optional[Callable[[], float]] = None, registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.fn = fn
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        if amount < 0:
+            raise ValueError("Counters can only be increased")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Sample]:
+        if self.fn is not None:
+            return [(self.name, {}, self.fn())]
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """Value that goes up and down, e.g. uploads in flight.
+
+    ``fn`` makes an unlabelled gauge read its value at scrape time.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 fn: Optional[Callable[[], float]] = None, registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.fn = fn
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[Sample]:
+        if self.fn is not None:
+            return [(self.name, {}, self.fn())]
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Histogram(Metric):
+    """Distribution of observed values, e.g. stage latencies, in cumulative buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: count per bucket (the last one is +Inf) and the sum
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        # Index of the first bucket the value fits in; len(buckets) is +Inf
+        position = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[position] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        with self._lock:
+            for key, counts in self._counts.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", {**labels, 'le': _format_value(bound)}, cumulative))
+                samples.append((f"{self.name}_sum", labels, self._sums[key]))
+                samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return 'NaN'
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _escape_help(text: str) -> str:
+    return text.replace('\\', r'\\').replace('\n', r'\n')
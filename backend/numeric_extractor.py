@@ -0,0 +1,191 @@
+import re
+from itertools import chain
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Same patterns the per-row parser used, so bulk results match it exactly
+NUMBER_PATTERN = r'-?\d+\.?\d*'
+NUMBER_ONLY_PATTERN = r'^-?\d+\.?\d*$'
+
+
+def is_numeric_column(column: pd.Series) -> bool:
+    """True for columns kept as native numbers by the typed cleaning mode"""
+    return pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column)
+
+
+class RowValues:
+    """Numeric values of every row of a sheet, stored as one flat array.
+
+    ``values`` holds all numbers in reading order (row by row, left to right,
+    and in order of appearance inside a cell); ``counts[i]`` is how many of
+    them belong to row ``i`` and ``offsets[i]`` where they start.
+    """
+
+    def __init__(self, values: np.ndarray, counts: np.ndarray):
+        self.values = values
+        self.counts = counts
+        self.offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def has_values(self) -> np.ndarray:
+        """Boolean mask of rows containing at least one number"""
+        return self.counts > 0
+
+    def nth(self, n: int, default: float) -> np.ndarray:
+        """n-th number of every row, or ``default`` where the row is shorter"""
+        result = np.full(len(self.counts), default, dtype=np.float64)
+        mask = self.counts > n
+        result[mask] = self.values[self.offsets[mask] + n]
+        return result
+
+    def last(self, default: float) -> np.ndarray:
+        """Last number of every row, or ``default`` for rows without numbers"""
+        result = np.full(len(self.counts), default, dtype=np.float64)
+        mask = self.counts > 0
+        result[mask] = self.values[self.offsets[mask] + self.counts[mask] - 1]
+        return result
+
+    def quantity(self) -> np.ndarray:
+        """First number, defaulting to 1"""
+        return self.nth(0, 1.0)
+
+    def unit_price(self) -> np.ndarray:
+        """Second number, defaulting to 0"""
+        return self.nth(1, 0.0)
+
+    def total(self) -> np.ndarray:
+        """Third number, else quantity * unit price, else the only number"""
+        first = self.nth(0, 0.0)
+        total = np.where(self.counts == 2, first * self.nth(1, 0.0), first)
+        return np.where(self.counts >= 3, self.nth(2, 0.0), total)
+
+    def amount(self) -> np.ndarray:
+        """Last number, defaulting to 0"""
+        return self.last(0.0)
+
+
+class NumericExtractor:
+    """Column-wise parser turning a cleaned sheet into per-row numbers and text.
+
+    Every cell is scanned exactly once per pattern with the vectorised
+    pandas string methods instead of running ``re.findall`` row by row, and
+    the matches are gathered into flat NumPy arrays.
+    """
+
+    def __init__(self, number_pattern: str = NUMBER_PATTERN):
+        self.number_pattern = number_pattern
+        self._number_re = re.compile(number_pattern)
+        self._number_only_re = re.compile(NUMBER_ONLY_PATTERN)
+        # Keyword alternations compiled once per keyword list
+        self._keyword_res: Dict[Tuple[str, ...], re.Pattern] = {}
+
+    def extract(self, df: pd.DataFrame) -> RowValues:
+        """Extract every number of every row in a single pass over the columns"""
+        n_rows = len(df)
+        row_ids = np.arange(n_rows, dtype=np.int64)
+        row_parts, col_parts, value_parts = [], [], []
+
+        for position, (_, column) in enumerate(df.items()):
+            if is_numeric_column(column):
+                # Typed columns are read straight from their float64 array
+                numbers = column.to_numpy(dtype=np.float64, na_value=np.nan)
+                present = ~np.isnan(numbers)
+                row_parts.append(row_ids[present])
+                col_parts.append(np.full(int(present.sum()), position, dtype=np.int64))
+                value_parts.append(numbers[present])
+                continue
+
+            # str.findall keeps one list per cell; flattening it is much
+            # cheaper than the per-match frame built by str.extractall
+            matches = self._text(column).str.findall(self._number_re)
+            lengths = np.fromiter(map(len, matches), dtype=np.int64, count=n_rows)
+            if not lengths.any():
+                continue
+            row_parts.append(np.repeat(row_ids, lengths))
+            col_parts.append(np.full(int(lengths.sum()), position, dtype=np.int64))
+            value_parts.append(np.array(list(chain.from_iterable(matches)), dtype=np.float64))
+
+        if not value_parts:
+            return RowValues(np.empty(0, dtype=np.float64), np.zeros(n_rows, dtype=np.int64))
+
+        rows = np.concatenate(row_parts)
+        cols = np.concatenate(col_parts)
+        values = np.concatenate(value_parts)
+
+        # Stable sort by (row, column); matches inside a cell keep their order
+        order = np.lexsort((cols, rows))
+        counts = np.bincount(rows, minlength=n_rows)
+        return RowValues(values[order], counts)
+
+    def descriptions(self, df: pd.DataFrame, default: str = "Item") -> np.ndarray:
+        """First non-empty, non-numeric cell of every row"""
+        masks, texts = [], []
+        for _, column in df.items():
+            if is_numeric_column(column):
+                # A number is never a description
+                masks.append(np.zeros(len(df), dtype=bool))
+                texts.append(np.full(len(df), None, dtype=object))
+                continue
+            stripped = self._text(column).str.strip()
+            is_number = stripped.str.match(self._number_only_re).to_numpy(dtype=bool)
+            masks.append((stripped != '').to_numpy(dtype=bool) & ~is_number)
+            texts.append(stripped.to_numpy(dtype=object))
+        return self._first_where(masks, texts, len(df), default)
+
+    def first_text(self, df: pd.DataFrame, default: str) -> np.ndarray:
+        """First non-empty cell of every row, stripped"""
+        masks, texts = [], []
+        for _, column in df.items():
+            if is_numeric_column(column):
+                present = column.notna().to_numpy(dtype=bool)
+                masks.append(present)
+                texts.append(self._text(column).astype(str).to_numpy(dtype=object))
+                continue
+            stripped = self._text(column).str.strip()
+            masks.append((stripped != '').to_numpy(dtype=bool))
+            texts.append(stripped.to_numpy(dtype=object))
+        return self._first_where(masks, texts, len(df), default)
+
+    def contains_any(self, df: pd.DataFrame, keywords: List[str]) -> np.ndarray:
+        """Rows where any cell contains one of ``keywords`` (case-insensitive)"""
+        result = np.zeros(len(df), dtype=bool)
+        if not keywords:
+            return result
+        pattern = self._keyword_re(keywords)
+        for _, column in df.items():
+            if is_numeric_column(column):
+                continue
+            lowered = self._text(column).str.lower()
+            result |= lowered.str.contains(pattern, regex=True).to_numpy(dtype=bool)
+        return result
+
+    def _keyword_re(self, keywords: List[str]) -> re.Pattern:
+        key = tuple(keywords)
+        pattern = self._keyword_res.get(key)
+        if pattern is None:
+            pattern = re.compile('|'.join(re.escape(keyword) for keyword in keywords))
+            self._keyword_res[key] = pattern
+        return pattern
+
+    def _text(self, column: pd.Series) -> pd.Series:
+        """Column as strings, positionally indexed"""
+        return column.reset_index(drop=True)
+
+    def _first_where(self, masks: List[np.ndarray], texts: List[np.ndarray],
+                     n_rows: int, default: str) -> np.ndarray:
+        """Pick, per row, the text of the first column whose mask is set"""
+        result = np.full(n_rows, default, dtype=object)
+        if not masks:
+            return result
+        mask_matrix = np.column_stack(masks)
+        text_matrix = np.column_stack(texts)
+        found = mask_matrix.any(axis=1)
+        first = mask_matrix.argmax(axis=1)
+        result[found] = text_matrix[found, first[found]]
+        return result
@@ -0,0 +1,263 @@
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.lib import colors
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+from itertools import islice
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+import logging
+from pathlib import Path
+from processed_data import ProcessedWorkbook, EstimateSheet, FinancialSheet, Summary
+
+logger = logging.getLogger(__name__)
+
+# Page geometry, the same as PDFGenerator's document template
+PAGE_WIDTH, PAGE_HEIGHT = A4
+LEFT_MARGIN = 72
+RIGHT_MARGIN = 72
+TOP_MARGIN = 72
+BOTTOM_MARGIN = 18
+FRAME_WIDTH = PAGE_WIDTH - LEFT_MARGIN - RIGHT_MARGIN
+
+HEADER_ROW_HEIGHT = 27
+ROW_HEIGHT = 18
+CELL_PADDING = 6
+FONT = 'Helvetica'
+BOLD_FONT = 'Helvetica-Bold'
+FONT_SIZE = 10
+
+ESTIMATE_COLUMNS = (
+    ('Description', 3*inch, 'center'),
+    ('Quantity', 1*inch, 'center'),
+    ('Unit Price', 1.5*inch, 'center'),
+    ('Total', 1.5*inch, 'center'),
+)
+FINANCIAL_COLUMNS = (
+    ('Description', 4*inch, 'left'),
+    ('Amount', 2*inch, 'right'),
+)
+SUMMARY_COLUMNS = (
+    ('', 3*inch, 'left'),
+    ('', 2*inch, 'right'),
+)
+SUMMARY_FIRST_ROW_COLUMNS = (
+    ('', 3*inch, 'left'),
+    ('', 2*inch, 'left'),
+)
+
+Columns = Sequence[Tuple[str, float, str]]
+
+
+class FastPDFReport:
+    """Report drawn straight onto a reportlab canvas, row by row.
+
+    PDFGenerator builds a platypus story of flowables and lays it out in
+    ``doc.build``, which keeps every Table in memory until the end. This
+    renderer draws each row as soon as it is reached with fixed row
+    geometry: no flowables, no measuring, and a finished page is kept only
+    as its compressed content stream. Item tables repeat their header row
+    on every page; descriptions too wide for their column are cut short.
+    """
+
+    def __init__(self, output_path: Path):
+        self.canvas = canvas.Canvas(str(output_path), pagesize=A4, pageCompression=1)
+        self.y = PAGE_HEIGHT - TOP_MARGIN
+        self.pages = 1
+        # Columns of the table being drawn, so a page break can repeat its header
+        self._table: Optional[Columns] = None
+
+    def render(self, data: ProcessedWorkbook):
+        """Draw the whole report and write the file"""
+        self._text("FINANCIAL DOCUMENT PROCESSOR", BOLD_FONT, 24, colors.darkblue, align='center', after=30)
+        self._text("Professional Estimates & Financial Statements", BOLD_FONT, 14, colors.darkblue,
+                   align='center', after=40)
+        self._text(f"Source File: {data.file_name}", FONT, FONT_SIZE, after=20)
+
+        if data.estimates:
+            self._section_header("ESTIMATES")
+            for estimate in data.estimates:
+                self._estimate(estimate)
+            self._space(20)
+
+        if data.financial_statements:
+            self._section_header("FINANCIAL STATEMENTS")
+            for financial in data.financial_statements:
+                self._financial(financial)
+            self._space(20)
+
+        if data.summary:
+            self._summary(data.summary)
+
+        self.canvas.save()
+        logger.info(f"Fast PDF report written: {self.pages} pages")
+
+    def _estimate(self, estimate: EstimateSheet):
+        self._text(estimate.title, BOLD_FONT, 14, before=10, after=12)
+        if not len(estimate.items):
+            self._text("No estimate items found.", FONT, FONT_SIZE, after=20)
+            return
+
+        self._start_table(ESTIMATE_COLUMNS)
+        self._rows(ESTIMATE_COLUMNS, (
+            [description, f"{quantity:.2f}", f"${unit_price:.2f}", f"${total:.2f}"]
+            for description, quantity, unit_price, total in estimate.items.rows()
+        ), len(estimate.items))
+        self._row(ESTIMATE_COLUMNS, ['', '', 'TOTAL:', f"${estimate.total:.2f}"],
+                  background=colors.lightgrey, font=BOLD_FONT, size=12)
+        self._end_table(after=20)
+
+    def _financial(self, financial: FinancialSheet):
+        self._text(financial.title, BOLD_FONT, 14, before=10, after=12)
+        for section in financial.sections:
+            self._text(section.name, BOLD_FONT, 12, before=8, after=6)
+            if len(section.items):
+                self._start_table(FINANCIAL_COLUMNS)
+                self._rows(FINANCIAL_COLUMNS, (
+                    [description, f"${amount:.2f}"] for description, amount in section.items.rows()
+                ), len(section.items))
+                self._end_table(after=12)
+            else:
+                self._text("No items found in this section.", FONT, FONT_SIZE, after=12)
+        self._space(20)
+
+    def _summary(self, summary: Summary):
+        self._section_header("SUMMARY")
+        rows = [
+            ['Total Estimates', str(summary.total_estimates)],
+            ['Total Financial Statements', str(summary.total_financial_statements)],
+            ['Total Sheets Processed', str(summary.total_sheets)],
+            ['Grand Total', f"${summary.grand_total:.2f}"]
+        ]
+        # First and last rows are highlighted like PDFGenerator's summary table
+        for position, row in enumerate(rows):
+            if position == 0:
+                self._row(SUMMARY_FIRST_ROW_COLUMNS, row, height=HEADER_ROW_HEIGHT, background=colors.darkblue,
+                          font=BOLD_FONT, size=12, color=colors.whitesmoke)
+            elif position == len(rows) - 1:
+                self._row(SUMMARY_COLUMNS, row, background=colors.darkblue, font=BOLD_FONT, size=14,
+                          color=colors.whitesmoke)
+            else:
+                self._row(SUMMARY_COLUMNS, row, background=colors.lightblue)
+
+    def _section_header(self, text: str):
+        self._text(text, BOLD_FONT, 16, colors.darkblue, before=20, after=12)
+
+    def _text(self, text: str, font: str, size: float, color=colors.black, align: str = 'left',
+              before: float = 0, after: float = 0):
+        """One line of text, starting a new page if it does not fit"""
+        self._ensure(before + size * 1.2)
+        self.y -= before + size * 1.2
+        self.canvas.setFont(font, size)
+        self.canvas.setFillColor(color)
+        if align == 'center':
+            self.canvas.drawCentredString(LEFT_MARGIN + FRAME_WIDTH / 2, self.y, text)
+        else:
+            self.canvas.drawString(LEFT_MARGIN, self.y, self._fit(text, FRAME_WIDTH, font, size))
+        self._space(after)
+
+    def _start_table(self, columns: Columns):
+        self._ensure(HEADER_ROW_HEIGHT + ROW_HEIGHT)
+        self._table = columns
+        self._header_row(columns)
+
+    def _end_table(self, after: float):
+        self._table = None
+        self._space(after)
+
+    def _header_row(self, columns: Columns):
+        self._row(columns, [label for label, _, _ in columns], height=HEADER_ROW_HEIGHT,
+                  background=colors.grey, font=BOLD_FONT, size=12, color=colors.whitesmoke, padding=12)
+
+    def _row(self, columns: Columns, cells: List[str], **style: Any):
+        self._rows(columns, [cells], 1, **style)
+
+    def _rows(self, columns: Columns, rows: Iterable[List[str]], count: int, height: float = ROW_HEIGHT,
+              background=colors.beige, font: str = FONT, size: float = FONT_SIZE,
+              color=colors.black, padding: float = 3):
+        """``count`` bordered table rows, drawn in blocks that fill the rest of a page
+
+        ``padding`` is the space below the text of a row.
+        """
+        rows = iter(rows)
+        while count > 0:
+            fit = int((self.y - BOTTOM_MARGIN) // height)
+            if fit < 1:
+                self._new_page()
+                continue
+            block = min(fit, count)
+            self._block(columns, islice(rows, block), block, height, background, font, size, color, padding)
+            count -= block
+
+    def _block(self, columns: Columns, rows: Iterable[List[str]], count: int, height: float,
+               background, font: str, size: float, color, padding: float):
+        c = self.canvas
+        width = sum(column_width for _, column_width, _ in columns)
+        # Tables wider than the frame overhang both margins, as platypus centres them
+        left = LEFT_MARGIN + (FRAME_WIDTH - width) / 2
+        top = self.y
+        bottom = top - count * height
+
+        # One filled rectangle and one path of grid lines for the whole
+        # block, instead of a rectangle and lines per row
+        c.setFillColor(background)
+        c.rect(left, bottom, width, top - bottom, stroke=1, fill=1)
+        anchors = []
+        x = left
+        lines = []
+        for position, (_, column_width, align) in enumerate(columns):
+            if position:
+                lines.append((x, bottom, x, top))
+            anchor = {'center': x + column_width / 2, 'right': x + column_width - CELL_PADDING}.get(
+                align, x + CELL_PADDING
+            )
+            anchors.append((align, anchor, column_width - 2 * CELL_PADDING))
+            x += column_width
+        lines.extend((left, y, left + width, y) for y in (top - i * height for i in range(1, count)))
+        if lines:
+            c.lines(lines)
+
+        # All cell text goes into a single text object
+        text_object = c.beginText()
+        text_object.setFont(font, size)
+        text_object.setFillColor(color)
+        y = top
+        for cells in rows:
+            y -= height
+            baseline = y + padding + 1
+            for text, (align, x, max_width) in zip(cells, anchors):
+                text = self._fit(text, max_width, font, size)
+                if align == 'center':
+                    x -= stringWidth(text, font, size) / 2
+                elif align == 'right':
+                    x -= stringWidth(text, font, size)
+                text_object.setTextOrigin(x, baseline)
+                text_object.textOut(text)
+        c.drawText(text_object)
+        self.y = bottom
+
+    def _fit(self, text: str, width: float, font: str, size: float) -> str:
+        """``text`` cut short with an ellipsis if it is wider than ``width``"""
+        text = str(text)
+        # No glyph of the standard fonts is wider than 1.02 em, so short
+        # strings need no measuring
+        if len(text) * size * 1.02 <= width or stringWidth(text, font, size) <= width:
+            return text
+        while text and stringWidth(text + '...', font, size) > width:
+            # Drop roughly the overflowing share at once, then one by one
+            overflow = 1 - width / stringWidth(text + '...', font, size)
+            text = text[:min(len(text) - 1, int(len(text) * (1 - overflow)))]
+        return text + '...'
+
+    def _space(self, height: float):
+        self.y -= height
+
+    def _ensure(self, height: float):
+        if self.y - height < BOTTOM_MARGIN:
+            self._new_page()
+
+    def _new_page(self):
+        self.canvas.showPage()
+        self.pages += 1
+        self.y = PAGE_HEIGHT - TOP_MARGIN
+        if self._table is not None:
+            self._header_row(self._table)
@@ -4,16 +4,68 @@ from reportlab.lib.units import inch
 from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from typing import Dict, List, Any
+from typing import List, Optional, Sequence
 import logging
 from pathlib import Path
+from processed_data import ProcessedWorkbook, EstimateSheet, FinancialSheet, Summary
+from pdf_fast_report import FastPDFReport
+from instrumentation import stage
 
 logger = logging.getLogger(__name__)
 
+# Fixed geometry of item table rows, matching what reportlab measures for a
+# one-line cell, so rows never have to be measured. A body row grows by one
+# leading per extra line of its description.
+HEADER_ROW_HEIGHT = 27
+ROW_HEIGHT = 18
+ROW_LEADING = 12
+
+# Column widths of the item tables
+ESTIMATE_COL_WIDTHS = [3*inch, 1*inch, 1.5*inch, 1.5*inch]
+FINANCIAL_COL_WIDTHS = [4*inch, 2*inch]
+
+_HEADER_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+]
+
+# Estimate blocks; the last block of an estimate ends with the total row
+ESTIMATE_TABLE_STYLE = TableStyle(_HEADER_STYLE + [
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+])
+ESTIMATE_TOTAL_TABLE_STYLE = TableStyle(_HEADER_STYLE + [
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, -1), (-1, -1), 12),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+])
+FINANCIAL_TABLE_STYLE = TableStyle(_HEADER_STYLE + [
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+])
+
+
 class PDFGenerator:
-    def __init__(self):
+    def __init__(self, table_chunk_rows: int = 400, fast: Optional[bool] = None, fast_min_rows: int = 20000):
         self.styles = getSampleStyleSheet()
         self._setup_custom_styles()
+        # Item tables are laid out in blocks of table_chunk_rows rows.
+        # reportlab copies the remaining rows every time it splits a table
+        # across a page, so one table per sheet makes layout quadratic in its
+        # length; blocks of a few pages keep it linear
+        self.table_chunk_rows = table_chunk_rows
+        # fast=True draws the report straight onto a canvas (FastPDFReport)
+        # instead of laying out flowables; None picks it for workbooks with
+        # at least fast_min_rows item rows
+        self.fast = fast
+        self.fast_min_rows = fast_min_rows
     
     def _setup_custom_styles(self):
         """Setup custom paragraph styles"""
@@ -50,9 +102,16 @@ class PDFGenerator:
             textColor=colors.darkblue
         ))
     
-    def generate_pdf(self, data: Dict[str, Any], output_path: Path):
+    def generate_pdf(self, data: ProcessedWorkbook, output_path: Path):
         """Generate PDF from processed data"""
         try:
+            rows = self._item_rows(data)
+            if self._use_fast(rows):
+                with stage('pdf_canvas', rows=rows):
+                    FastPDFReport(output_path).render(data)
+                logger.info(f"PDF generated successfully: {output_path}")
+                return
+            
             doc = SimpleDocTemplate(
                 str(output_path),
                 pagesize=A4,
@@ -62,123 +121,103 @@ class PDFGenerator:
                 bottomMargin=18
             )
             
-            story = []
-            
-            # Add company header
-            story.append(Paragraph("FINANCIAL DOCUMENT PROCESSOR", self.styles['CustomTitle']))
-            story.append(Paragraph("Professional Estimates & Financial Statements", self.styles['CompanyHeader']))
-            story.append(Spacer(1, 20))
-            
-            # Add file information
-            story.append(Paragraph(f"<b>Source File:</b> {data['file_name']}", self.styles['Normal']))
-            story.append(Spacer(1, 20))
-            
-            # Process estimates
-            if data['estimates']:
-                story.append(Paragraph("ESTIMATES", self.styles['SectionHeader']))
-                for estimate in data['estimates']:
-                    story.extend(self._create_estimate_section(estimate))
+            with stage('pdf_story', rows=rows):
+                story = []
+                
+                # Add company header
+                story.append(Paragraph("FINANCIAL DOCUMENT PROCESSOR", self.styles['CustomTitle']))
+                story.append(Paragraph("Professional Estimates & Financial Statements", self.styles['CompanyHeader']))
                 story.append(Spacer(1, 20))
-            
-            # Process financial statements
-            if data['financial_statements']:
-                story.append(Paragraph("FINANCIAL STATEMENTS", self.styles['SectionHeader']))
-                for financial in data['financial_statements']:
-                    story.extend(self._create_financial_section(financial))
+                
+                # Add file information
+                story.append(Paragraph(f"<b>Source File:</b> {data.file_name}", self.styles['Normal']))
                 story.append(Spacer(1, 20))
-            
-            # Add summary
-            if data['summary']:
-                story.extend(self._create_summary_section(data['summary']))
-            
+                
+                # Process estimates
+                if data.estimates:
+                    story.append(Paragraph("ESTIMATES", self.styles['SectionHeader']))
+                    for estimate in data.estimates:
+                        story.extend(self._create_estimate_section(estimate))
+                    story.append(Spacer(1, 20))
+                
+                # Process financial statements
+                if data.financial_statements:
+                    story.append(Paragraph("FINANCIAL STATEMENTS", self.styles['SectionHeader']))
+                    for financial in data.financial_statements:
+                        story.extend(self._create_financial_section(financial))
+                    story.append(Spacer(1, 20))
+                
+                # Add summary
+                if data.summary:
+                    story.extend(self._create_summary_section(data.summary))
+                
             # Build PDF
-            doc.build(story)
+            with stage('pdf_build', rows=rows):
+                doc.build(story)
             logger.info(f"PDF generated successfully: {output_path}")
             
         except Exception as e:
             logger.error(f"Error generating PDF: {str(e)}")
             raise
     
-    def _create_estimate_section(self, estimate: Dict[str, Any]) -> List:
+    def _use_fast(self, rows: int) -> bool:
+        """Whether to draw a workbook of ``rows`` item rows with the canvas renderer"""
+        if self.fast is not None:
+            return self.fast
+        return rows >= self.fast_min_rows
+    
+    def _item_rows(self, data: ProcessedWorkbook) -> int:
+        """Estimate and financial statement items in the workbook"""
+        rows = sum(len(estimate.items) for estimate in data.estimates)
+        rows += sum(len(section.items) for financial in data.financial_statements
+                    for section in financial.sections)
+        return rows
+    
+    def _create_estimate_section(self, estimate: EstimateSheet) -> List:
         """Create estimate section for PDF"""
         elements = []
         
         # Estimate title
-        elements.append(Paragraph(f"<b>{estimate['title']}</b>", self.styles['Heading2']))
+        elements.append(Paragraph(f"<b>{estimate.title}</b>", self.styles['Heading2']))
         elements.append(Spacer(1, 12))
         
-        # Create table for estimate items
-        if estimate['items']:
-            table_data = [['Description', 'Quantity', 'Unit Price', 'Total']]
-            
-            for item in estimate['items']:
-                table_data.append([
-                    item['description'],
-                    f"{item['quantity']:.2f}",
-                    f"${item['unit_price']:.2f}",
-                    f"${item['total']:.2f}"
-                ])
+        # Create tables for estimate items
+        if len(estimate.items):
+            rows = [
+                [description, f"{quantity:.2f}", f"${unit_price:.2f}", f"${total:.2f}"]
+                for description, quantity, unit_price, total in estimate.items.rows()
+            ]
             
             # Add total row
-            table_data.append(['', '', '<b>TOTAL:</b>', f"<b>${estimate['total']:.2f}</b>"])
+            rows.append(['', '', '<b>TOTAL:</b>', f"<b>${estimate.total:.2f}</b>"])
             
-            table = Table(table_data, colWidths=[3*inch, 1*inch, 1.5*inch, 1.5*inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, -1), (-1, -1), 12),
-                ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ]))
-            
-            elements.append(table)
+            elements.extend(self._item_tables(
+                ['Description', 'Quantity', 'Unit Price', 'Total'], rows, ESTIMATE_COL_WIDTHS,
+                ESTIMATE_TABLE_STYLE, last_style=ESTIMATE_TOTAL_TABLE_STYLE
+            ))
         else:
             elements.append(Paragraph("No estimate items found.", self.styles['Normal']))
         
         elements.append(Spacer(1, 20))
         return elements
     
-    def _create_financial_section(self, financial: Dict[str, Any]) -> List:
+    def _create_financial_section(self, financial: FinancialSheet) -> List:
         """Create financial statement section for PDF"""
         elements = []
         
         # Financial statement title
-        elements.append(Paragraph(f"<b>{financial['title']}</b>", self.styles['Heading2']))
+        elements.append(Paragraph(f"<b>{financial.title}</b>", self.styles['Heading2']))
         elements.append(Spacer(1, 12))
         
         # Process sections
-        for section in financial['sections']:
-            elements.append(Paragraph(f"<b>{section['name']}</b>", self.styles['Heading3']))
+        for section in financial.sections:
+            elements.append(Paragraph(f"<b>{section.name}</b>", self.styles['Heading3']))
             
-            if section['items']:
-                table_data = [['Description', 'Amount']]
-                
-                for item in section['items']:
-                    table_data.append([
-                        item['description'],
-                        f"${item['amount']:.2f}"
-                    ])
-                
-                table = Table(table_data, colWidths=[4*inch, 2*inch])
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 12),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ]))
-                
-                elements.append(table)
+            if len(section.items):
+                rows = [[description, f"${amount:.2f}"] for description, amount in section.items.rows()]
+                elements.extend(self._item_tables(
+                    ['Description', 'Amount'], rows, FINANCIAL_COL_WIDTHS, FINANCIAL_TABLE_STYLE
+                ))
             else:
                 elements.append(Paragraph("No items found in this section.", self.styles['Normal']))
             
@@ -187,17 +226,42 @@ class PDFGenerator:
         elements.append(Spacer(1, 20))
         return elements
     
-    def _create_summary_section(self, summary: Dict[str, Any]) -> List:
+    def _item_tables(self, header: List[str], rows: List[List[str]], col_widths: Sequence[float],
+                     style: TableStyle, last_style: Optional[TableStyle] = None) -> List[Table]:
+        """Lay out item rows as consecutive tables of at most table_chunk_rows rows
+        
+        Every block starts with ``header``, which is also repeated when a
+        block breaks across pages. ``last_style`` styles the final block,
+        e.g. one ending in a total row.
+        """
+        tables = []
+        for start in range(0, len(rows), self.table_chunk_rows):
+            chunk = rows[start:start + self.table_chunk_rows]
+            last = start + self.table_chunk_rows >= len(rows)
+            tables.append(Table(
+                [header] + chunk,
+                colWidths=col_widths,
+                rowHeights=[HEADER_ROW_HEIGHT] + [self._row_height(row[0]) for row in chunk],
+                repeatRows=1,
+                style=last_style if last and last_style is not None else style
+            ))
+        return tables
+    
+    def _row_height(self, description: str) -> float:
+        """Height of a body row, from the line count of its description"""
+        return ROW_HEIGHT + ROW_LEADING * str(description).count('\n')
+    
+    def _create_summary_section(self, summary: Summary) -> List:
         """Create summary section for PDF"""
         elements = []
         
         elements.append(Paragraph("SUMMARY", self.styles['SectionHeader']))
         
         summary_data = [
-            ['Total Estimates', str(summary['total_estimates'])],
-            ['Total Financial Statements', str(summary['total_financial_statements'])],
-            ['Total Sheets Processed', str(summary['total_sheets'])],
-            ['Grand Total', f"${summary['grand_total']:.2f}"]
+            ['Total Estimates', str(summary.total_estimates)],
+            ['Total Financial Statements', str(summary.total_financial_statements)],
+            ['Total Sheets Processed', str(summary.total_sheets)],
+            ['Grand Total', f"${summary.grand_total:.2f}"]
         ]
         
         table = Table(summary_data, colWidths=[3*inch, 2*inch])
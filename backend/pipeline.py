@@ -0,0 +1,210 @@
+import asyncio
+import threading
+from pathlib import Path
+from typing import Dict, Any, Callable, NamedTuple, Optional, Sequence, Tuple
+import logging
+from excel_processor import ExcelProcessor
+from pdf_generator import PDFGenerator
+from excel_generator import ExcelGenerator
+from processed_data import ProcessedWorkbook
+from sheet_cache import SheetCache
+from instrumentation import StageRecorder, run_instrumented, run_timed
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Output formats a client can request; also the stage names after 'process'
+OUTPUT_FORMATS = ('pdf', 'excel')
+OUTPUT_SUFFIXES = {'pdf': '.pdf', 'excel': '.xlsx'}
+# Input workbooks the pipeline reads
+WORKBOOK_SUFFIXES = ('.xlsx', '.xls')
+
+# Bump whenever a generator change alters the rendered outputs
+RENDER_VERSION = 3
+
+ProgressCallback = Callable[[str, str], None]
+
+# Recorded in the API process by run_pipeline_async, from worker timings
+STAGE_SECONDS = Histogram('excel_processor_stage_seconds', 'Worker time of pipeline stages', ['stage'])
+STAGE_FAILURES = Counter('excel_processor_stage_failures_total', 'Pipeline stages that raised', ['stage'])
+ROWS_PROCESSED = Counter('excel_processor_rows_processed_total', 'Line items and data rows of processed workbooks')
+
+# Format names accepted from API and command-line clients, mapped to OUTPUT_FORMATS
+FORMAT_ALIASES = {'pdf': 'pdf', 'excel': 'excel', 'xlsx': 'excel'}
+
+
+def parse_formats(formats: str) -> Tuple[str, ...]:
+    """Pipeline formats for a comma-separated list of format names, in OUTPUT_FORMATS order
+
+    Raises ValueError for an unknown name or when no format is given.
+    """
+    requested = set()
+    for name in formats.split(','):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in FORMAT_ALIASES:
+            raise ValueError(f"Unknown output format: {name}")
+        requested.add(FORMAT_ALIASES[name])
+    if not requested:
+        raise ValueError("At least one output format is required")
+    return tuple(fmt for fmt in OUTPUT_FORMATS if fmt in requested)
+
+
+# Entry points executed inside WorkerPool workers. They are module-level
+# functions so they can be pickled into worker processes.
+
+
+def make_processor(sheet_cache: Optional[SheetCache] = None) -> ExcelProcessor:
+    """Processor configured for pool workers"""
+    # The request already runs on a pool worker, so sheets are processed serially
+    return ExcelProcessor(max_workers=1, sheet_cache=sheet_cache)
+
+
+class WorkerComponents(NamedTuple):
+    """Processor and renderers reused by every request a worker runs"""
+    processor: ExcelProcessor
+    pdf: PDFGenerator
+    excel: ExcelGenerator
+
+
+# Built once per worker process (or thread) instead of per request, which
+# saves rebuilding the reportlab style sheet, the openpyxl styles and the
+# keyword classifier each time. Keeping them thread-local means the
+# instances never have to be shared between threads.
+_worker = threading.local()
+
+
+def worker_components() -> WorkerComponents:
+    """This worker's components, created on first use"""
+    components = getattr(_worker, 'components', None)
+    if components is None:
+        components = WorkerComponents(make_processor(getattr(_worker, 'sheet_cache', None)),
+                                      PDFGenerator(), ExcelGenerator())
+        _worker.components = components
+    return components
+
+
+def init_worker(sheet_cache: Optional[SheetCache] = None):
+    """WorkerPool initializer: build the components before the first request
+
+    Bind it to a ``sheet_cache`` with functools.partial to have unchanged
+    sheets of re-uploaded workbooks taken from that cache.
+    """
+    _worker.sheet_cache = sheet_cache
+    worker_components()
+
+
+def pipeline_fingerprint() -> str:
+    """Identifies the processor configuration and renderer versions"""
+    return f"{make_processor().config_fingerprint()}|render-{RENDER_VERSION}"
+
+
+def output_filename(file_id: str, fmt: str) -> str:
+    """Name of the ``fmt`` output file for ``file_id``"""
+    return f"{file_id}_processed{OUTPUT_SUFFIXES[fmt]}"
+
+
+def process_workbook(upload_path: Path, data: Optional[bytes] = None,
+                     sheets: Optional[Sequence[str]] = None) -> ProcessedWorkbook:
+    """Parse and classify an uploaded workbook, from ``data`` if given, limited to ``sheets`` if given"""
+    return worker_components().processor.process_file(upload_path, data, sheets)
+
+
+def render_pdf(processed_data: ProcessedWorkbook, pdf_path: Path):
+    """Write the PDF output for a processed workbook"""
+    worker_components().pdf.generate_pdf(processed_data, pdf_path)
+
+
+def render_excel(processed_data: ProcessedWorkbook, excel_path: Path):
+    """Write the Excel output for a processed workbook"""
+    worker_components().excel.generate_excel(processed_data, excel_path)
+
+
+RENDERERS = {'pdf': render_pdf, 'excel': render_excel}
+
+
+def run_pipeline(upload_path: Path, outputs: Dict[str, Path],
+                 progress: Optional[ProgressCallback] = None) -> ProcessedWorkbook:
+    """Process a workbook and write the requested outputs, one after another.
+
+    ``outputs`` maps each wanted format of OUTPUT_FORMATS to its path.
+    ``progress(stage, status)`` is called with 'running' and then 'done' or
+    'failed' for each stage that runs. Returns the processed workbook.
+    """
+    processed_data = _run_stage(progress, 'process', process_workbook, upload_path)
+    for fmt, path in outputs.items():
+        _run_stage(progress, fmt, RENDERERS[fmt], processed_data, path)
+    return processed_data
+
+
+async def run_pipeline_async(pool, upload_path: Path, outputs: Dict[str, Path],
+                             progress: Optional[ProgressCallback] = None, data: Optional[bytes] = None,
+                             recorder: Optional[StageRecorder] = None,
+                             processed_data: Optional[ProcessedWorkbook] = None,
+                             sheets: Optional[Sequence[str]] = None):
+    """Like run_pipeline, but on ``pool`` with the renderers running concurrently.
+
+    Processing happens once; the PDF and Excel renderers are independent
+    and CPU-bound, so each runs on its own pool worker. Formats missing
+    from ``outputs`` are not rendered at all. Small uploads can be passed
+    as ``data`` to skip writing them to disk, and a workbook processed
+    earlier as ``processed_data`` to skip processing altogether. ``sheets``
+    limits processing to the matching sheets.
+
+    With a ``recorder``, each stage reports its own timings and those of
+    the steps inside it, and is profiled if the recorder asks for it.
+    """
+    if processed_data is None:
+        processed_data = await run_stage(pool, 'process', process_workbook, upload_path, data, sheets,
+                                         progress=progress, recorder=recorder)
+    results = await asyncio.gather(
+        *(run_stage(pool, fmt, RENDERERS[fmt], processed_data, path, progress=progress, recorder=recorder)
+          for fmt, path in outputs.items()),
+        return_exceptions=True
+    )
+    # Let every renderer finish before reporting the first failure
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+
+async def run_stage(pool, name: str, fn: Callable, *args: Any, progress: Optional[ProgressCallback] = None,
+                    recorder: Optional[StageRecorder] = None) -> Any:
+    """Run one pipeline stage on ``pool``, reporting its progress and metrics"""
+    report = progress or _no_progress
+    report(name, 'running')
+    try:
+        if recorder is None:
+            result, seconds = await pool.run(run_timed, fn, args)
+        else:
+            result, records = await pool.run(
+                run_instrumented, name, fn, args, recorder.profile_path(name), recorder.profiler
+            )
+            recorder.records.extend(records)
+            seconds = records[0]['wall_s']
+    except Exception:
+        STAGE_FAILURES.inc(stage=name)
+        report(name, 'failed')
+        raise
+    STAGE_SECONDS.observe(seconds, stage=name)
+    if name == 'process':
+        ROWS_PROCESSED.inc(result.row_count())
+    report(name, 'done')
+    return result
+
+
+def _run_stage(progress: Optional[ProgressCallback], name: str, fn: Callable, *args: Any) -> Any:
+    report = progress or _no_progress
+    report(name, 'running')
+    try:
+        result = fn(*args)
+    except Exception:
+        report(name, 'failed')
+        raise
+    report(name, 'done')
+    return result
+
+
+def _no_progress(stage: str, status: str):
+    pass
@@ -0,0 +1,214 @@
+from dataclasses import dataclass, replace
+from typing import Dict, List, Any, Iterator, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+
+class EstimateItems:
+    """Line items of an estimate, stored as one array per column.
+
+    ``description`` is an object array and ``quantity``, ``unit_price`` and
+    ``total`` are float64 arrays of the same length. ``row_data`` holds the
+    source row of every item as a 2-D object array, and is only kept when
+    the processor was asked to retain row payloads.
+    """
+
+    __slots__ = ('description', 'quantity', 'unit_price', 'total', 'row_data')
+
+    def __init__(self, description: np.ndarray, quantity: np.ndarray, unit_price: np.ndarray,
+                 total: np.ndarray, row_data: Optional[np.ndarray] = None):
+        self.description = description
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.total = total
+        self.row_data = row_data
+
+    def __len__(self) -> int:
+        return len(self.description)
+
+    def rows(self) -> Iterator[Tuple[str, float, float, float]]:
+        """(description, quantity, unit_price, total) of every item, as Python values"""
+        return zip(self.description.tolist(), self.quantity.tolist(),
+                   self.unit_price.tolist(), self.total.tolist())
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Items in the dict layout of the original result"""
+        items = [
+            {'description': description, 'quantity': quantity, 'unit_price': unit_price, 'total': total}
+            for description, quantity, unit_price, total in self.rows()
+        ]
+        if self.row_data is not None:
+            for item, row in zip(items, self.row_data.tolist()):
+                item['row_data'] = row
+        return items
+
+
+class FinancialItems:
+    """Line items of a financial statement section, one array per column"""
+
+    __slots__ = ('description', 'amount', 'row_data')
+
+    def __init__(self, description: np.ndarray, amount: np.ndarray, row_data: Optional[np.ndarray] = None):
+        self.description = description
+        self.amount = amount
+        self.row_data = row_data
+
+    def __len__(self) -> int:
+        return len(self.description)
+
+    def rows(self) -> Iterator[Tuple[str, float]]:
+        """(description, amount) of every item, as Python values"""
+        return zip(self.description.tolist(), self.amount.tolist())
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Items in the dict layout of the original result"""
+        items = [{'description': description, 'amount': amount} for description, amount in self.rows()]
+        if self.row_data is not None:
+            for item, row in zip(items, self.row_data.tolist()):
+                item['row_data'] = row
+        return items
+
+
+@dataclass
+class EstimateSheet:
+    __slots__ = ('sheet_name', 'title', 'headers', 'items', 'total')
+    sheet_name: str
+    title: str
+    headers: List[Any]
+    items: EstimateItems
+    total: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'sheet_name': self.sheet_name,
+            'title': self.title,
+            'items': self.items.to_dicts(),
+            'subtotals': [],
+            'total': self.total,
+            'headers': self.headers
+        }
+
+
+@dataclass
+class FinancialSection:
+    __slots__ = ('name', 'items')
+    name: str
+    items: FinancialItems
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'items': self.items.to_dicts()}
+
+
+@dataclass
+class FinancialSheet:
+    __slots__ = ('sheet_name', 'title', 'headers', 'sections')
+    sheet_name: str
+    title: str
+    headers: List[Any]
+    sections: List[FinancialSection]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'sheet_name': self.sheet_name,
+            'title': self.title,
+            'sections': [section.to_dict() for section in self.sections],
+            'headers': self.headers
+        }
+
+
+@dataclass
+class DataSheet:
+    """A sheet that is neither an estimate nor a financial statement"""
+    __slots__ = ('sheet_name', 'title', 'headers', 'data')
+    sheet_name: str
+    title: str
+    headers: List[Any]
+    data: pd.DataFrame
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'sheet_name': self.sheet_name,
+            'title': self.title,
+            'data': self.data.to_dict('records'),
+            'headers': self.headers
+        }
+
+
+@dataclass
+class Summary:
+    __slots__ = ('total_estimates', 'total_financial_statements', 'total_sheets', 'grand_total')
+    total_estimates: int
+    total_financial_statements: int
+    total_sheets: int
+    grand_total: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total_estimates': self.total_estimates,
+            'total_financial_statements': self.total_financial_statements,
+            'total_sheets': self.total_sheets,
+            'grand_total': self.grand_total
+        }
+
+
+@dataclass
+class ProcessedWorkbook:
+    """Result of ExcelProcessor.process_file.
+
+    Sheets are grouped by content type; ``sheets`` maps the names of mixed
+    sheets to their data. ``to_dict()`` returns the nested-dict layout the
+    processor produced before this model existed.
+    """
+    __slots__ = ('file_name', 'sheets', 'estimates', 'financial_statements', 'summary')
+    file_name: str
+    sheets: Dict[str, DataSheet]
+    estimates: List[EstimateSheet]
+    financial_statements: List[FinancialSheet]
+    summary: Optional[Summary]
+
+    def row_count(self) -> int:
+        """Line items and data rows across all sheets"""
+        return (
+            sum(len(sheet.data) for sheet in self.sheets.values())
+            + sum(len(estimate.items) for estimate in self.estimates)
+            + sum(len(section.items) for financial in self.financial_statements for section in financial.sections)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'file_name': self.file_name,
+            'sheets': {name: sheet.to_dict() for name, sheet in self.sheets.items()},
+            'estimates': [estimate.to_dict() for estimate in self.estimates],
+            'financial_statements': [financial.to_dict() for financial in self.financial_statements],
+            'summary': self.summary.to_dict() if self.summary is not None else {}
+        }
+
+
+def combine_workbooks(file_name: str, workbooks: Sequence[ProcessedWorkbook]) -> ProcessedWorkbook:
+    """One result holding the sheets of all ``workbooks``, for a combined report.
+
+    Sheet names get the workbook's position as a prefix (``2_Budget``) so
+    they stay unique, and titles its file name. The summary adds up theirs.
+    """
+    combined = ProcessedWorkbook(file_name=file_name, sheets={}, estimates=[], financial_statements=[],
+                                 summary=Summary(0, 0, 0, 0.0))
+    for position, workbook in enumerate(workbooks, 1):
+        for sheet in workbook.sheets.values():
+            sheet = _renamed(sheet, position, workbook.file_name)
+            combined.sheets[sheet.sheet_name] = sheet
+        combined.estimates.extend(
+            _renamed(estimate, position, workbook.file_name) for estimate in workbook.estimates
+        )
+        combined.financial_statements.extend(
+            _renamed(financial, position, workbook.file_name) for financial in workbook.financial_statements
+        )
+        if workbook.summary is not None:
+            combined.summary.total_estimates += workbook.summary.total_estimates
+            combined.summary.total_financial_statements += workbook.summary.total_financial_statements
+            combined.summary.total_sheets += workbook.summary.total_sheets
+            combined.summary.grand_total += workbook.summary.grand_total
+    return combined
+
+
+def _renamed(sheet, position: int, file_name: str):
+    return replace(sheet, sheet_name=f"{position}_{sheet.sheet_name}", title=f"{file_name}: {sheet.title}")
@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence
+import logging
+from sqlite_cache import SQLiteCache
+from pipeline import run_pipeline_async, pipeline_fingerprint, output_filename, ProgressCallback
+from processed_data import ProcessedWorkbook
+from instrumentation import StageRecorder
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache(SQLiteCache):
+    """Content-addressed cache of rendered outputs in the output directory.
+
+    Outputs are keyed by the SHA-256 of the uploaded workbook combined with
+    the pipeline fingerprint, so re-uploading the same bytes reuses the PDF
+    and XLSX rendered earlier while a processor or renderer change starts
+    afresh. The index lives in SQLite next to the files; entries older than
+    ``max_age`` seconds are dropped and the least recently used ones are
+    evicted once the cached files exceed ``max_bytes``.
+    """
+
+    table = 'cache_entries'
+    columns = 'key TEXT NOT NULL, format TEXT NOT NULL, filename TEXT NOT NULL'
+    primary_key = 'key, format'
+    discard_columns = ('filename',)
+    entry_name = 'outputs'
+
+    def __init__(self, db_path: Path, output_dir: Path, max_bytes: int,
+                 max_age: float, fingerprint: Optional[str] = None):
+        self.output_dir = Path(output_dir)
+        self.fingerprint = fingerprint if fingerprint is not None else pipeline_fingerprint()
+        self.hits = 0
+        self.misses = 0
+        super().__init__(db_path, max_bytes, max_age)
+
+    def key(self, content_hash: str, sheets: Optional[Sequence[str]] = None) -> str:
+        """Cache key for a workbook with the given content hash, limited to ``sheets`` if given"""
+        if sheets:
+            content_hash = f"{content_hash}|sheets={json.dumps(sorted({pattern.lower() for pattern in sheets}))}"
+        return hashlib.sha256(f"{content_hash}|{self.fingerprint}".encode()).hexdigest()
+
+    def lookup(self, key: str, formats: Sequence[str]) -> Dict[str, str]:
+        """Output file names already cached for ``key``, by format"""
+        now = time.time()
+        found = {}
+        stale = []
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute(
+                f"SELECT rowid, * FROM cache_entries WHERE key = ? AND format IN ({','.join('?' * len(formats))})",
+                (key, *formats)
+            ).fetchall()
+            for row in rows:
+                if now - row['created_at'] > self.max_age or not (self.output_dir / row['filename']).exists():
+                    stale.append(row)
+                    continue
+                found[row['format']] = row['filename']
+                conn.execute(
+                    "UPDATE cache_entries SET last_used = ? WHERE key = ? AND format = ?",
+                    (now, key, row['format'])
+                )
+            self._delete(conn, stale)
+
+        self.hits += len(found)
+        self.misses += len(formats) - len(found)
+        return found
+
+    def add(self, key: str, fmt: str, rendered_path: Path) -> str:
+        """Move a freshly rendered output into the cache and return its file name"""
+        filename = output_filename(key, fmt)
+        target = self.output_dir / filename
+        os.replace(rendered_path, target)
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, format, filename, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, fmt, filename, target.stat().st_size, now, now)
+            )
+        # Outputs of this key are never evicted for size, so a result that
+        # was just handed out stays downloadable
+        self.evict(keep=[key])
+        return filename
+
+    def _discard(self, row: sqlite3.Row):
+        """Remove an evicted output's file"""
+        path = self.output_dir / row['filename']
+        if path.exists():
+            path.unlink()
+
+    @property
+    def hit_ratio(self) -> float:
+        """Share of output lookups served from the cache in this process"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Size of the cache and hit/miss counts of this process"""
+        return {
+            **super().stats(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hit_ratio,
+            'evictions': self.evictions
+        }
+
+    async def get_or_render(self, pool, upload_path: Path, content_hash: str, formats: Sequence[str],
+                            progress: Optional[ProgressCallback] = None,
+                            data: Optional[bytes] = None,
+                            recorder: Optional[StageRecorder] = None,
+                            processed_data: Optional[ProcessedWorkbook] = None,
+                            sheets: Optional[Sequence[str]] = None) -> Dict[str, str]:
+        """Output file names for ``formats``, rendering only the ones not cached
+
+        With ``processed_data``, missing outputs are rendered from it and
+        ``upload_path`` is not read. Outputs of only some ``sheets`` are
+        cached apart from those of the whole workbook.
+        """
+        # The index and file moves block; keep them off the event loop
+        loop = asyncio.get_running_loop()
+        key = self.key(content_hash, sheets)
+        filenames = await loop.run_in_executor(None, self.lookup, key, formats)
+        missing = [fmt for fmt in formats if fmt not in filenames]
+        if progress is not None:
+            for fmt in filenames:
+                progress(fmt, 'done')
+
+        if not missing:
+            if progress is not None:
+                progress('process', 'done')
+            logger.info(f"Serving cached outputs for {content_hash[:12]}")
+            return {fmt: filenames[fmt] for fmt in formats}
+
+        # Render under unique names first so concurrent uploads of the same
+        # workbook never write to the same cached file
+        staging = {fmt: self.output_dir / output_filename(f"{uuid.uuid4()}.partial", fmt) for fmt in missing}
+        try:
+            await run_pipeline_async(pool, upload_path, staging, progress=progress, data=data, recorder=recorder,
+                                     processed_data=processed_data, sheets=sheets)
+            for fmt, path in staging.items():
+                filenames[fmt] = await loop.run_in_executor(None, self.add, key, fmt, path)
+        finally:
+            await loop.run_in_executor(None, _remove, list(staging.values()))
+
+        return {fmt: filenames[fmt] for fmt in formats}
+
+
+def _remove(paths: List[Path]):
+    for path in paths:
+        if path.exists():
+            path.unlink()
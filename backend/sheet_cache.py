@@ -0,0 +1,76 @@
+import hashlib
+import pickle
+import time
+from contextlib import closing
+from typing import Any, Dict, Iterable, Sequence, Tuple
+import logging
+from sqlite_cache import SQLiteCache
+
+logger = logging.getLogger(__name__)
+
+# (content_type, sheet result) as returned by ExcelProcessor._process_sheet
+CachedSheet = Tuple[str, Any]
+
+
+class SheetCache(SQLiteCache):
+    """Processed sheets shared by every worker, keyed by sheet fingerprint.
+
+    A workbook re-uploaded with a few sheets edited only has those sheets
+    read and processed again; the results of the others come from here.
+    Keys combine the sheet's fingerprint (see
+    WorkbookReader.sheet_fingerprint), its name and the processor
+    configuration. Results are pickled into SQLite, which worker processes
+    share safely; entries older than ``max_age`` seconds are dropped and
+    the least recently used ones are evicted once they exceed
+    ``max_bytes``. The cache only holds paths and limits, so it can be
+    handed to worker processes.
+    """
+
+    table = 'sheet_results'
+    columns = 'key TEXT NOT NULL, content_type TEXT NOT NULL, result BLOB NOT NULL'
+    entry_name = 'sheets'
+
+    def key(self, fingerprint: str, sheet_name: str, config: str) -> str:
+        """Cache key of a sheet with the given fingerprint and name, for a processor configuration"""
+        return hashlib.sha256(f"{fingerprint}|{sheet_name}|{config}".encode()).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, CachedSheet]:
+        """Cached results of ``keys``, by key; missing and expired ones are left out"""
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute(
+                f"SELECT key, content_type, result FROM sheet_results "
+                f"WHERE key IN ({','.join('?' * len(keys))}) AND created_at >= ?",
+                (*keys, now - self.max_age)
+            ).fetchall()
+            for row in rows:
+                key = row['key']
+                try:
+                    found[key] = (row['content_type'], pickle.loads(row['result']))
+                except Exception as e:
+                    # Written by code whose classes have since changed
+                    logger.warning(f"Dropping unreadable cached sheet {key[:12]}: {str(e)}")
+                    conn.execute("DELETE FROM sheet_results WHERE key = ?", (key,))
+            conn.executemany("UPDATE sheet_results SET last_used = ? WHERE key = ?",
+                             [(now, key) for key in found])
+        return found
+
+    def put_many(self, entries: Iterable[Tuple[str, str, Any]]):
+        """Store ``(key, content_type, result)`` entries, then evict down to the limits"""
+        now = time.time()
+        rows = []
+        for key, content_type, result in entries:
+            blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+            rows.append((key, content_type, blob, len(blob), now, now))
+        if not rows:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO sheet_results (key, content_type, result, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        self.evict(keep=[row[0] for row in rows])
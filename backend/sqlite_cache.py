@@ -0,0 +1,101 @@
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Sequence
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteCache:
+    """Base of the caches indexed in SQLite and bounded by age and total size.
+
+    Every row of ``table`` has a ``key``, the ``columns`` a subclass adds,
+    and its ``size``, ``created_at`` and ``last_used`` times. Rows older
+    than ``max_age`` seconds are dropped and the least recently used ones
+    are evicted once their sizes add up to more than ``max_bytes``. Each
+    call opens its own short-lived connection, so processes can share the
+    database; the cache itself only holds its settings and counters.
+    """
+
+    table = ''
+    # Column definitions besides the bookkeeping ones, key first
+    columns = ''
+    primary_key = 'key'
+    # Columns _discard needs to release what a row refers to
+    discard_columns: Sequence[str] = ()
+    # What the rows are, for log messages
+    entry_name = 'entries'
+
+    def __init__(self, db_path: Path, max_bytes: int, max_age: float):
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evictions = 0
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    {self.columns},
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY ({self.primary_key})
+                )
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_lru ON {self.table} (last_used)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def evict(self, keep: Collection[str] = ()) -> int:
+        """Drop expired entries, then least recently used ones until under ``max_bytes``
+
+        Entries whose key is in ``keep`` are never evicted for size, so a
+        result that was just handed out stays available.
+        """
+        keep = set(keep)
+        columns = ', '.join(('rowid', 'key', 'size', *self.discard_columns))
+        with closing(self._connect()) as conn, conn:
+            expired = conn.execute(
+                f"SELECT {columns} FROM {self.table} WHERE created_at < ?", (time.time() - self.max_age,)
+            ).fetchall()
+            self._delete(conn, expired)
+
+            victims = []
+            total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+            if total > self.max_bytes:
+                for row in conn.execute(f"SELECT {columns} FROM {self.table} ORDER BY last_used").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    if row['key'] in keep:
+                        continue
+                    victims.append(row)
+                    total -= row['size']
+                self._delete(conn, victims)
+
+        evicted = len(expired) + len(victims)
+        if evicted:
+            self.evictions += evicted
+            logger.info(f"Evicted {evicted} cached {self.entry_name}")
+        return evicted
+
+    def _delete(self, conn: sqlite3.Connection, rows: List[sqlite3.Row]):
+        """Remove rows, selected with their rowid and ``discard_columns``, and what they refer to"""
+        conn.executemany(f"DELETE FROM {self.table} WHERE rowid = ?", [(row['rowid'],) for row in rows])
+        for row in rows:
+            self._discard(row)
+
+    def _discard(self, row: sqlite3.Row):
+        """Release what an evicted row refers to besides the row itself"""
+
+    def stats(self) -> Dict[str, Any]:
+        """Number and size of the cached entries"""
+        with closing(self._connect()) as conn:
+            entries, size = conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+            ).fetchone()
+        return {'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes}
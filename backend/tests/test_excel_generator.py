@@ -0,0 +1,49 @@
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from excel_generator import ExcelGenerator
+from processed_data import (
+    ProcessedWorkbook, EstimateSheet, EstimateItems, FinancialSheet, FinancialSection,
+    FinancialItems, DataSheet, Summary
+)
+
+
+def processed_workbook(rows: int) -> ProcessedWorkbook:
+    """An estimate, a financial statement and a data sheet of ``rows`` rows each"""
+    numbers = np.arange(rows, dtype=float)
+    descriptions = np.array([f"Item {n}" for n in range(rows)], dtype=object)
+    estimate = EstimateSheet(
+        sheet_name='Estimate', title='Estimate - Estimate', headers=['Description', 'Quantity', 'Unit Price', 'Total'],
+        items=EstimateItems(descriptions, numbers, numbers, numbers * numbers), total=float((numbers * numbers).sum())
+    )
+    financial = FinancialSheet(
+        sheet_name='Statement', title='Financial Statement - Statement', headers=['Item', 'Amount'],
+        sections=[FinancialSection('Section 1', FinancialItems(descriptions, numbers))]
+    )
+    data = DataSheet(
+        sheet_name='Data', title='Data - Data', headers=['Project', 'Hours'],
+        data=pd.DataFrame({'Project': descriptions, 'Hours': numbers})
+    )
+    return ProcessedWorkbook(
+        file_name='workbook.xlsx', sheets={'Data': data}, estimates=[estimate], financial_statements=[financial],
+        summary=Summary(1, 1, 1, estimate.total)
+    )
+
+
+def styles_size(path) -> int:
+    with zipfile.ZipFile(path) as archive:
+        return archive.getinfo('xl/styles.xml').file_size
+
+
+@pytest.mark.parametrize('write_only', [False, True])
+def test_styles_do_not_grow_with_row_count(tmp_path, write_only):
+    generator = ExcelGenerator(write_only=write_only)
+    sizes = []
+    for rows in (10, 10000):
+        path = tmp_path / f"{rows}.xlsx"
+        generator.generate_excel(processed_workbook(rows), path)
+        sizes.append(styles_size(path))
+    assert sizes[0] == sizes[1]
@@ -0,0 +1,24 @@
+from openpyxl import Workbook
+
+from excel_processor import ExcelProcessor
+from sheet_cache import SheetCache
+
+
+def test_row_data_settings_do_not_share_entries(tmp_path):
+    path = tmp_path / 'estimate.xlsx'
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Estimate'
+    sheet.append(['Description', 'Quantity', 'Unit Price', 'Total'])
+    sheet.append(['Labor - Project Setup', 40, 75, 3000])
+    sheet.append(['Materials - Hardware', 1, 2500, 2500])
+    sheet.append(['Equipment Rental', 2, 250, 500])
+    workbook.save(path)
+    cache = SheetCache(tmp_path / 'sheets.db', 1024 ** 2, 3600)
+
+    without_rows = ExcelProcessor(max_workers=1, sheet_cache=cache).process_file(path)
+    with_rows = ExcelProcessor(max_workers=1, keep_row_data=True, sheet_cache=cache).process_file(path)
+
+    assert without_rows.estimates[0].items.row_data is None
+    assert with_rows.estimates[0].items.row_data is not None
+    assert cache.stats()['entries'] == 2
@@ -0,0 +1,22 @@
+import pandas as pd
+from openpyxl import Workbook
+
+from workbook_reader import WorkbookReader
+
+
+def test_blank_rows_match_read_excel(tmp_path):
+    path = tmp_path / 'blank_rows.xlsx'
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Costs'
+    # A blank first row, then blank rows between the values of a single column
+    for value in [None, 'materials', 10, None, 20, None, None, 'total', 30]:
+        sheet.append([value])
+    workbook.save(path)
+
+    with WorkbookReader(path) as reader:
+        frame = reader.read_sheet('Costs')
+    expected = pd.read_excel(path, sheet_name='Costs')
+
+    pd.testing.assert_frame_equal(frame, expected)
+    assert len(frame) == 8
@@ -0,0 +1,73 @@
+import hashlib
+from pathlib import Path
+from typing import NamedTuple, Optional
+import aiofiles
+import logging
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured maximum size"""
+
+
+class SavedUpload(NamedTuple):
+    """An uploaded file after streaming: its hash, size and, if small, its bytes"""
+    content_hash: str
+    size: int
+    data: Optional[bytes]
+
+
+async def save_upload(file, upload_path: Path, max_bytes: int, memory_limit: int = 0) -> SavedUpload:
+    """Copy an UploadFile in chunks, hashing it on the way.
+
+    Starlette has already received the whole body by then and spooled the
+    file, in memory up to 1MB and to a temporary file beyond, so this is a
+    second copy. Uploads of at most ``memory_limit`` bytes are kept in
+    memory; ``data`` then holds their content. Larger uploads are written
+    to ``upload_path`` and ``data`` is None. Copying stops with
+    UploadTooLargeError as soon as ``max_bytes`` is exceeded.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    buffered = bytearray()
+    out = None
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+            digest.update(chunk)
+
+            if out is None and size <= memory_limit:
+                buffered.extend(chunk)
+                continue
+            if out is None:
+                # Too big to keep in memory: spill what we have and stream the rest
+                out = await aiofiles.open(upload_path, 'wb')
+                await out.write(bytes(buffered))
+                buffered = bytearray()
+            await out.write(chunk)
+    except BaseException:
+        if out is not None:
+            await out.close()
+            out = None
+            Path(upload_path).unlink()
+        raise
+    finally:
+        if out is not None:
+            await out.close()
+
+    if out is not None:
+        return SavedUpload(digest.hexdigest(), size, None)
+    if memory_limit <= 0:
+        # An empty upload with in-memory mode off still gets its file
+        async with aiofiles.open(upload_path, 'wb'):
+            pass
+        return SavedUpload(digest.hexdigest(), size, None)
+    return SavedUpload(digest.hexdigest(), size, bytes(buffered))
@@ -0,0 +1,206 @@
+import pandas as pd
+import numpy as np
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
+from pandas.io.parsers import TextParser
+from io import BytesIO
+from fnmatch import fnmatchcase
+import hashlib
+import re
+from typing import List, Sequence, Any, Optional
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Formats openpyxl can stream; anything else (e.g. legacy .xls) goes through pandas
+OPENPYXL_SUFFIXES = ('.xlsx', '.xlsm', '.xltx', '.xltm')
+
+# Read by xlrd, which can load the sheets of these on demand
+XLRD_SUFFIXES = ('.xls',)
+
+# Worksheet XML is fingerprinted in chunks of this size
+FINGERPRINT_CHUNK_SIZE = 1024 * 1024
+
+# Shared-string cells of a worksheet's XML, and the string index they hold
+SHARED_STRING_TYPE = re.compile(rb'\st="s"')
+SHARED_STRING_INDEX = re.compile(rb'\st="s"[^>]*>\s*<(?:\w+:)?v>(\d+)<')
+
+
+def _last_complete_cell(xml: bytes) -> int:
+    """Offset in a piece of worksheet XML up to which no cell is cut off"""
+    # After the last cell end (</c> or </x:c>), unless a cell opens later
+    end = 0
+    for tag in (b'</c>', b':c>'):
+        position = xml.rfind(tag)
+        if position >= 0:
+            end = max(end, position + len(tag))
+    start = max(xml.rfind(b'<c'), xml.rfind(b':c '))
+    if start >= end:
+        return start
+    # Otherwise before the last tag, which may itself be cut off
+    return max(xml.rfind(b'<'), end)
+
+
+class SheetSelectionError(ValueError):
+    """Raised when a sheet selection matches none of a workbook's sheets"""
+
+
+def select_sheets(sheet_names: Sequence[str], patterns: Optional[Sequence[str]]) -> List[str]:
+    """The sheets matching any of ``patterns``, in workbook order; all of them without patterns
+
+    Patterns are sheet names or shell-style wildcards such as ``Q*``, and
+    like Excel sheet names they ignore case.
+    """
+    if not patterns:
+        return list(sheet_names)
+    lowered = [pattern.lower() for pattern in patterns]
+    selected = [name for name in sheet_names
+                if any(name.lower() == pattern or fnmatchcase(name.lower(), pattern) for pattern in lowered)]
+    if not selected:
+        raise SheetSelectionError(f"No sheet matches {', '.join(patterns)}; "
+                                  f"the workbook has {', '.join(sheet_names)}")
+    return selected
+
+
+class WorkbookReader:
+    """Read a workbook one sheet at a time.
+
+    Sheets are streamed from an openpyxl ``read_only`` workbook with
+    ``iter_rows(values_only=True)`` and turned into a DataFrame only when
+    requested, so peak memory is bounded by the largest sheet instead of
+    the whole workbook. The resulting frames match ``pd.read_excel``.
+    Sheet names come from the workbook's metadata; legacy ``.xls`` sheets
+    are also only loaded once read.
+
+    When ``data`` is given the workbook is read from those bytes and
+    ``file_path`` only provides its name and format.
+    """
+
+    def __init__(self, file_path: Path, data: Optional[bytes] = None):
+        self.file_path = Path(file_path)
+        self._workbook = None
+        self._excel_file = None
+
+        source = BytesIO(data) if data is not None else self.file_path
+        suffix = self.file_path.suffix.lower()
+        if suffix in OPENPYXL_SUFFIXES:
+            self._workbook = load_workbook(source, read_only=True, data_only=True, keep_links=False)
+        elif suffix in XLRD_SUFFIXES:
+            self._excel_file = pd.ExcelFile(source, engine='xlrd', engine_kwargs={'on_demand': True})
+        else:
+            self._excel_file = pd.ExcelFile(source)
+
+    def __enter__(self) -> 'WorkbookReader':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Release the underlying file handle"""
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
+        if self._excel_file is not None:
+            self._excel_file.close()
+            self._excel_file = None
+
+    def sheet_names(self) -> List[str]:
+        """Names of the sheets holding cell data, in workbook order"""
+        if self._workbook is not None:
+            return [ws.title for ws in self._workbook.worksheets]
+        return list(self._excel_file.sheet_names)
+
+    def sheet_fingerprint(self, sheet_name: str) -> Optional[str]:
+        """Hash of everything a sheet's values are read from, or None if unknown
+
+        For xlsx workbooks this is the worksheet's XML in the zip, the
+        shared strings it refers to and the workbook's date settings, so a
+        sheet keeps its fingerprint when other sheets are edited. The XML
+        is streamed in chunks and no cell data is parsed. Other formats
+        have no fingerprint.
+        """
+        if self._workbook is None:
+            return None
+        try:
+            # Reaches into openpyxl's read-only workbook for the zip member
+            # and shared strings it already holds
+            ws = self._workbook[sheet_name]
+            strings = ws._shared_strings
+            digest = hashlib.sha256()
+            # Dates are told apart by their cell style
+            digest.update(repr((self._workbook.epoch, sorted(self._workbook._date_formats),
+                                sorted(self._workbook._timedelta_formats))).encode())
+            used = set()
+            typed = matched = 0
+            with self._workbook._archive.open(ws._worksheet_path) as xml:
+                tail = b''
+                for chunk in iter(lambda: xml.read(FINGERPRINT_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    # Scan up to the last complete cell; the rest waits for
+                    # the next chunk
+                    buffer = tail + chunk
+                    cut = _last_complete_cell(buffer)
+                    scanned, tail = buffer[:cut], buffer[cut:]
+                    typed += len(SHARED_STRING_TYPE.findall(scanned))
+                    indices = SHARED_STRING_INDEX.findall(scanned)
+                    matched += len(indices)
+                    used.update(map(int, indices))
+                typed += len(SHARED_STRING_TYPE.findall(tail))
+                indices = SHARED_STRING_INDEX.findall(tail)
+                matched += len(indices)
+                used.update(map(int, indices))
+            if matched != typed:
+                # Cells written in an unexpected layout; cover every string
+                used = range(len(strings))
+            for index in sorted(used):
+                digest.update(b'\0' + str(strings[index]).encode('utf-8', 'surrogatepass'))
+            return digest.hexdigest()
+        except Exception as e:
+            logger.warning(f"Cannot fingerprint sheet {sheet_name}, so it is not cached: {str(e)}")
+            return None
+
+    def read_sheet(self, sheet_name: str) -> pd.DataFrame:
+        """Read a single sheet, using its first row as column names"""
+        if self._workbook is None:
+            return self._excel_file.parse(sheet_name)
+
+        rows = self._sheet_rows(self._workbook[sheet_name])
+        if not rows:
+            return pd.DataFrame()
+        # pd.read_excel keeps blank rows, so a blank first row stays the header
+        return TextParser(rows, header=0, skip_blank_lines=False).read()
+
+    def _sheet_rows(self, ws) -> List[List[Any]]:
+        """Raw cell values of a worksheet, trimmed and padded like pandas does"""
+        # Stored dimensions can be stale; let openpyxl discover the real extent
+        ws.reset_dimensions()
+
+        rows = []
+        last_row_with_data = -1
+        for row_number, values in enumerate(ws.iter_rows(values_only=True)):
+            row = [self._convert_value(value) for value in values]
+            while row and row[-1] == "":
+                row.pop()
+            if row:
+                last_row_with_data = row_number
+            rows.append(row)
+
+        rows = rows[:last_row_with_data + 1]
+        if rows:
+            width = max(len(row) for row in rows)
+            for row in rows:
+                if len(row) < width:
+                    row.extend([""] * (width - len(row)))
+        return rows
+
+    def _convert_value(self, value: Any) -> Any:
+        """Normalise a cell value the way pandas' openpyxl engine does"""
+        if value is None:
+            return ""
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str) and value in ERROR_CODES:
+            return np.nan
+        return value
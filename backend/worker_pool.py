@@ -0,0 +1,105 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, Callable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturatedError(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+
+
+class WorkerPool:
+    """Bounded pool running CPU-heavy pipeline work off the event loop.
+
+    At most ``max_workers`` tasks execute at once; up to ``max_queue`` more
+    requests may wait for a worker. Requests beyond that are rejected with
+    PoolSaturatedError so the API can answer 503 instead of piling up work.
+    Background work (batch files, jobs) waits for a free worker instead,
+    and never takes the queue places meant for interactive uploads.
+    ``initializer`` runs once in every worker as it starts.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: int = 8,
+                 executor: str = 'process', initializer: Optional[Callable[[], None]] = None):
+        if executor not in ('process', 'thread'):
+            raise ValueError(f"Unknown executor: {executor}")
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.executor = executor
+        self.initializer = initializer
+        self._executor: Optional[Executor] = None
+        self._active = 0
+        self._waiting = 0
+        self._released: Optional[asyncio.Condition] = None
+
+    def start(self):
+        """Start the worker processes or threads"""
+        if self._executor is None:
+            executor_class = ProcessPoolExecutor if self.executor == 'process' else ThreadPoolExecutor
+            self._executor = executor_class(max_workers=self.max_workers, initializer=self.initializer)
+            logger.info(f"Started {self.max_workers} {self.executor} workers (queue depth {self.max_queue})")
+
+    def shutdown(self):
+        """Stop the workers, waiting for running tasks to finish"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    @property
+    def capacity(self) -> int:
+        """Requests that can be admitted at once, running or waiting"""
+        return self.max_workers + self.max_queue
+
+    @property
+    def active(self) -> int:
+        """Requests currently admitted"""
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        """Admitted requests waiting for a free worker"""
+        return max(0, self._active - self.max_workers)
+
+    @property
+    def waiting(self) -> int:
+        """Background tasks waiting for a free worker before being admitted"""
+        return self._waiting
+
+    @asynccontextmanager
+    async def slot(self, wait: bool = False):
+        """Admit one request for the duration of the block, or refuse it
+
+        With ``wait``, wait until a worker is free instead of refusing.
+        """
+        if self._released is None:
+            self._released = asyncio.Condition()
+        if wait:
+            self._waiting += 1
+            try:
+                async with self._released:
+                    await self._released.wait_for(lambda: self._active < self.max_workers)
+                    self._active += 1
+            finally:
+                self._waiting -= 1
+        elif self._active >= self.capacity:
+            raise PoolSaturatedError(f"All {self.max_workers} workers busy and {self.max_queue} requests queued")
+        else:
+            self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            async with self._released:
+                self._released.notify_all()
+
+    async def run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Run ``fn`` on a worker and await its result"""
+        if self._executor is None:
+            raise RuntimeError("Worker pool is not running")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
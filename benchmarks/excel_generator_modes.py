@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark ExcelGenerator's regular and write-only modes on synthetic data
+"""
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from excel_generator import ExcelGenerator
+from processed_data import ProcessedWorkbook, EstimateSheet, EstimateItems, DataSheet, Summary
+
+
+def synthetic_data(rows: int, columns: int) -> ProcessedWorkbook:
+    """Processed data with one estimate and one raw sheet of ``rows`` rows each"""
+    index = np.arange(rows)
+    quantity = (index % 40 + 1).astype(np.float64)
+    unit_price = 12.5 + index % 100
+    items = EstimateItems(
+        description=np.array([f"Line item {i}" for i in range(rows)], dtype=object),
+        quantity=quantity,
+        unit_price=unit_price,
+        total=quantity * unit_price
+    )
+    headers = [f"Column {c}" for c in range(columns)]
+    table = pd.DataFrame({
+        header: [f"text {i}" if c == 0 else i * c for i in range(rows)]
+        for c, header in enumerate(headers)
+    }, dtype=object)
+    return ProcessedWorkbook(
+        file_name='synthetic.xlsx',
+        sheets={'Data': DataSheet(sheet_name='Data', title='Data - Data', headers=headers, data=table)},
+        estimates=[EstimateSheet(
+            sheet_name='Estimate',
+            title='Estimate - Estimate',
+            headers=[],
+            items=items,
+            total=sum(items.total.tolist())
+        )],
+        financial_statements=[],
+        summary=Summary(total_estimates=1, total_financial_statements=0, total_sheets=1, grand_total=0.0)
+    )
+
+
+def timed(write_only: bool, data: ProcessedWorkbook, output_path: Path) -> float:
+    """Seconds for one generate_excel call"""
+    start = time.perf_counter()
+    ExcelGenerator(write_only=write_only).generate_excel(data, output_path)
+    return time.perf_counter() - start
+
+
+def peak_memory(write_only: bool, data: ProcessedWorkbook, output_path: Path) -> float:
+    """Peak MiB allocated during one generate_excel call (slow: traces allocations)"""
+    tracemalloc.start()
+    ExcelGenerator(write_only=write_only).generate_excel(data, output_path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--columns', type=int, default=10, help="columns of the raw data sheet")
+    parser.add_argument('--memory', action='store_true', help="also measure peak memory in a traced run")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'mode':>11} {'seconds':>9} {'peak MiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = Path(tmp) / "out.xlsx"
+        for rows in args.rows:
+            data = synthetic_data(rows, args.columns)
+            for write_only in (False, True):
+                elapsed = timed(write_only, data, output_path)
+                peak = f"{peak_memory(write_only, data, output_path):.1f}" if args.memory else '-'
+                mode = 'write-only' if write_only else 'regular'
+                print(f"{rows:>8} {mode:>11} {elapsed:>9.2f} {peak:>9}")
+
+
+if __name__ == "__main__":
+    main()
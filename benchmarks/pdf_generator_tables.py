@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark PDFGenerator's item tables and canvas renderer: time per 1k rows
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from pdf_generator import PDFGenerator
+from processed_data import (
+    ProcessedWorkbook, EstimateSheet, EstimateItems, FinancialSheet, FinancialSection, FinancialItems, Summary
+)
+
+
+def synthetic_data(rows: int, section_rows: int = 50) -> ProcessedWorkbook:
+    """Processed data with an estimate and a financial statement of ``rows`` items each"""
+    index = np.arange(rows)
+    quantity = (index % 40 + 1).astype(np.float64)
+    unit_price = 12.5 + index % 100
+    estimate = EstimateSheet(
+        sheet_name='Estimate',
+        title='Estimate - Estimate',
+        headers=[],
+        items=EstimateItems(
+            description=np.array([f"Line item {i}" for i in range(rows)], dtype=object),
+            quantity=quantity,
+            unit_price=unit_price,
+            total=quantity * unit_price
+        ),
+        total=float((quantity * unit_price).sum())
+    )
+    sections = [
+        FinancialSection(
+            name=f"Section {start // section_rows + 1}",
+            items=FinancialItems(
+                description=np.array([f"Account {i}" for i in range(start, min(start + section_rows, rows))],
+                                     dtype=object),
+                amount=index[start:start + section_rows] * 3.25
+            )
+        )
+        for start in range(0, rows, section_rows)
+    ]
+    financial = FinancialSheet(
+        sheet_name='Financial', title='Financial Statement - Financial', headers=[], sections=sections
+    )
+    return ProcessedWorkbook(
+        file_name='synthetic.xlsx',
+        sheets={},
+        estimates=[estimate],
+        financial_statements=[financial],
+        summary=Summary(total_estimates=1, total_financial_statements=1, total_sheets=0,
+                        grand_total=estimate.total)
+    )
+
+
+def timed(chunk_rows: int, fast: bool, data: ProcessedWorkbook, output_path: Path) -> float:
+    """Seconds for one generate_pdf call"""
+    start = time.perf_counter()
+    PDFGenerator(table_chunk_rows=chunk_rows, fast=fast).generate_pdf(data, output_path)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--chunk-rows', type=int, default=400, help="rows per table block")
+    parser.add_argument('--single', action='store_true',
+                        help="also time one table per estimate (slow for large row counts)")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'tables':>8} {'seconds':>9} {'s/1k rows':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = Path(tmp) / "out.pdf"
+        for rows in args.rows:
+            data = synthetic_data(rows)
+            layouts = [('chunked', args.chunk_rows, False), ('canvas', args.chunk_rows, True)]
+            if args.single:
+                layouts.append(('single', rows + 1, False))
+            for layout, chunk_rows, fast in layouts:
+                elapsed = timed(chunk_rows, fast, data, output_path)
+                # Both sheets hold ``rows`` items
+                print(f"{rows:>8} {layout:>8} {elapsed:>9.2f} {elapsed / (2 * rows) * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
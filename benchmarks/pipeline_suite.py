@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Benchmark every pipeline stage on synthetic workbooks and write JSON results
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from importlib import metadata
+from itertools import product
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "backend"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from instrumentation import run_instrumented
+from pipeline import process_workbook, render_pdf, render_excel
+from synthetic_workbooks import KINDS, write_workbook
+
+STAGES = ('process_file', 'generate_pdf', 'generate_excel', 'upload')
+
+# (rows, columns, sheets) per workbook, from 1k to 1M cells
+PRESETS = {
+    'quick': [(100, 10, 1), (1000, 10, 1)],
+    'full': [(100, 10, 1), (1000, 10, 1), (5000, 10, 2), (25000, 10, 4)],
+}
+
+# Packages whose versions are recorded with the results
+PACKAGES = ('numpy', 'pandas', 'openpyxl', 'reportlab', 'fastapi')
+
+Case = Dict[str, Any]
+Result = Dict[str, Any]
+
+
+def cases(args: argparse.Namespace) -> List[Case]:
+    """Workbooks to benchmark: a preset, or the product of --rows, --columns and --sheets"""
+    if args.rows or args.columns or args.sheets:
+        shapes = list(product(args.rows or [1000], args.columns or [10], args.sheets or [1]))
+    else:
+        shapes = PRESETS[args.preset]
+    return [
+        {'kind': kind, 'rows': rows, 'columns': columns, 'sheets': sheets, 'cells': rows * columns * sheets}
+        for kind in args.kinds for rows, columns, sheets in shapes
+    ]
+
+
+def case_name(case: Case) -> str:
+    return f"{case['kind']}-{case['rows']}x{case['columns']}x{case['sheets']}"
+
+
+def workbook(case: Case, directory: Path, seed: int) -> Path:
+    """The case's workbook in ``directory``, written unless already there"""
+    path = directory / f"{case_name(case)}-seed{seed}.xlsx"
+    if not path.exists():
+        write_workbook(path, case['kind'], case['rows'], case['columns'], case['sheets'], seed)
+    return path
+
+
+def measure(name: str, fn: Callable, args: Sequence[Any], repeat: int) -> Tuple[Result, Any]:
+    """Run ``fn(*args)`` ``repeat`` times; the stage result and what ``fn`` returned"""
+    runs = []
+    for _ in range(repeat):
+        value, records = run_instrumented(name, fn, args)
+        runs.append(records)
+    return summarize(name, runs), value
+
+
+def summarize(name: str, runs: List[List[Dict[str, Any]]]) -> Result:
+    """Wall time of every run; CPU time, peak memory and inner steps of the fastest"""
+    walls = [records[0]['wall_s'] for records in runs]
+    fastest = runs[walls.index(min(walls))]
+    # Inner steps (read, clean, pdf_build, ...) summed over sheets
+    steps: Dict[str, float] = {}
+    for record in fastest[1:]:
+        steps[record['stage']] = round(steps.get(record['stage'], 0.0) + record['wall_s'], 6)
+    return {
+        'stage': name,
+        'wall_s': walls,
+        'wall_s_min': min(walls),
+        'wall_s_median': statistics.median(walls),
+        'cpu_s': fastest[0]['cpu_s'],
+        'peak_rss_mb': max(record['peak_rss_mb'] or 0 for record in fastest) or None,
+        'steps': steps,
+    }
+
+
+class UploadClient:
+    """The FastAPI app in-process, configured so that no upload is served from cache"""
+
+    def __init__(self, directory: Path):
+        # main creates its directories and databases in the working directory
+        os.chdir(directory)
+        os.environ['RESULT_CACHE_MAX_AGE'] = '0'
+        os.environ['SHEET_CACHE_MAX_BYTES'] = '0'
+        os.environ['MAX_UPLOAD_BYTES'] = str(1024 ** 3)
+        from fastapi.testclient import TestClient
+        import main
+        # Keep the per-request log lines out of the results table
+        logging.getLogger().setLevel(logging.WARNING)
+        self.client = TestClient(main.app)
+        self.client.__enter__()
+
+    def close(self):
+        self.client.__exit__(None, None, None)
+
+    def upload(self, path: Path) -> List[Dict[str, Any]]:
+        """Stage records of one /upload?debug=true request, the whole request first"""
+        start = time.perf_counter()
+        with open(path, 'rb') as f:
+            response = self.client.post('/upload?debug=true', files={'file': (path.name, f)})
+        wall = time.perf_counter() - start
+        response.raise_for_status()
+        timings = response.json()['timings']
+        request = {'stage': 'upload', 'wall_s': round(wall, 6), 'cpu_s': None,
+                   'peak_rss_mb': max((record['peak_rss_mb'] or 0 for record in timings), default=None)}
+        return [request] + timings
+
+    def measure(self, path: Path, repeat: int) -> Result:
+        result = summarize('upload', [self.upload(path) for _ in range(repeat)])
+        # Worker peaks are in the records; CPU time is spread over processes
+        result['cpu_s'] = None
+        return result
+
+
+def run_case(case: Case, path: Path, stages: Sequence[str], repeat: int,
+             client: Optional[UploadClient], output_dir: Path) -> List[Result]:
+    results = []
+    data = None
+    if {'process_file', 'generate_pdf', 'generate_excel'} & set(stages):
+        # The renderers need the processed data either way
+        result, data = measure('process_file', process_workbook, (path,), repeat)
+        if 'process_file' in stages:
+            results.append(result)
+    if 'generate_pdf' in stages:
+        results.append(measure('generate_pdf', render_pdf, (data, output_dir / "out.pdf"), repeat)[0])
+    if 'generate_excel' in stages:
+        results.append(measure('generate_excel', render_excel, (data, output_dir / "out.xlsx"), repeat)[0])
+    if 'upload' in stages and client is not None:
+        results.append(client.measure(path, repeat))
+
+    for result in results:
+        result.update(case=case_name(case), **case, file_bytes=path.stat().st_size,
+                      item_rows=data.row_count() if data is not None else None)
+    return results
+
+
+def environment(args: argparse.Namespace) -> Dict[str, Any]:
+    """Commit, interpreter, machine and package versions the results were taken on"""
+    def git(*command: str) -> Optional[str]:
+        try:
+            return subprocess.run(['git', *command], cwd=ROOT, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'packages': versions,
+        'arguments': {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+    }
+
+
+def compare(results: List[Result], baseline_path: Path, threshold: float) -> int:
+    """Print median wall time against a baseline file; number of regressions beyond ``threshold``"""
+    baseline = {
+        (result['case'], result['stage']): result
+        for result in json.loads(baseline_path.read_text())['results']
+    }
+    print(f"\nAgainst {baseline_path}:")
+    print(f"{'case':<28} {'stage':<15} {'before':>9} {'after':>9} {'change':>8}")
+    regressions = 0
+    for result in results:
+        before = baseline.get((result['case'], result['stage']))
+        if before is None:
+            continue
+        change = result['wall_s_median'] / before['wall_s_median'] - 1 if before['wall_s_median'] else 0.0
+        flag = ''
+        if change > threshold:
+            regressions += 1
+            flag = '  REGRESSION'
+        print(f"{result['case']:<28} {result['stage']:<15} {before['wall_s_median']:>9.3f} "
+              f"{result['wall_s_median']:>9.3f} {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='quick')
+    parser.add_argument('--kinds', nargs='+', choices=KINDS, default=list(KINDS))
+    parser.add_argument('--rows', type=int, nargs='+', help="data rows per sheet (replaces the preset)")
+    parser.add_argument('--columns', type=int, nargs='+', help="columns per sheet (replaces the preset)")
+    parser.add_argument('--sheets', type=int, nargs='+', help="sheets per workbook (replaces the preset)")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3, help="runs per stage; the median is compared")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workbooks', type=Path, help="keep generated workbooks here and reuse them")
+    parser.add_argument('--output', type=Path, default=Path("benchmark-results.json"))
+    parser.add_argument('--compare', type=Path, help="earlier results to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="slowdown reported as a regression, e.g. 0.2 for 20%%")
+    args = parser.parse_args()
+    output = args.output.resolve()
+    baseline = args.compare.resolve() if args.compare else None
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        workbook_dir = args.workbooks.resolve() if args.workbooks else tmp / "workbooks"
+        workbook_dir.mkdir(parents=True, exist_ok=True)
+        client = UploadClient(tmp) if 'upload' in args.stages else None
+        try:
+            if client is not None:
+                # Start the worker processes before anything is timed
+                client.upload(workbook({'kind': 'estimate', 'rows': 10, 'columns': 4, 'sheets': 1},
+                                       workbook_dir, args.seed))
+
+            print(f"{'case':<28} {'stage':<15} {'cells':>8} {'median s':>9} {'min s':>9} {'peak MiB':>9}")
+            for case in cases(args):
+                path = workbook(case, workbook_dir, args.seed)
+                for result in run_case(case, path, args.stages, args.repeat, client, tmp):
+                    results.append(result)
+                    peak = f"{result['peak_rss_mb']:.1f}" if result['peak_rss_mb'] else '-'
+                    print(f"{result['case']:<28} {result['stage']:<15} {result['cells']:>8} "
+                          f"{result['wall_s_median']:>9.3f} {result['wall_s_min']:>9.3f} {peak:>9}")
+        finally:
+            if client is not None:
+                client.close()
+
+    output.write_text(json.dumps({'environment': environment(args), 'results': results}, indent=2))
+    print(f"\nResults written to {output}")
+
+    if baseline is not None and compare(results, baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
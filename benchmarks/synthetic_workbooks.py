@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Write reproducible synthetic estimate, financial and mixed workbooks
+"""
+import argparse
+from pathlib import Path
+from typing import Iterator, List
+
+import numpy as np
+from openpyxl import Workbook
+
+KINDS = ('estimate', 'financial', 'mixed')
+
+# Cell text is drawn from these lists; the estimate and financial words
+# contain enough of ExcelProcessor's keywords to be classified as such, the
+# mixed ones and the filler none at all
+ESTIMATE_ITEMS = ['Labor', 'Materials', 'Equipment rental', 'Site preparation', 'Permits', 'Electrical',
+                  'Plumbing', 'Finishing', 'Cleanup', 'Project management']
+FINANCIAL_ITEMS = ['Revenue', 'Cost of Goods Sold', 'Gross Profit', 'Salaries expense', 'Rent expense',
+                   'Utilities expense', 'Interest income', 'Current assets', 'Current liabilities',
+                   'Retained equity', 'Cash flow from operations', 'Balance carried forward']
+MIXED_ITEMS = ['Website', 'Mobile app', 'Database', 'API integration', 'Testing', 'Deployment']
+FILLER_WORDS = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel']
+
+# Financial rows per section; each section opens with a "Section n" row
+SECTION_ROWS = 40
+
+
+def write_workbook(path: Path, kind: str, rows: int, columns: int, sheets: int = 1, seed: int = 0) -> Path:
+    """Write a ``kind`` workbook of ``sheets`` sheets with ``rows`` rows by ``columns`` columns each.
+
+    Rows exclude the header row. Columns beyond the ones a sheet of that
+    kind needs are filled with short words. The same arguments always give
+    the same cell values.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown workbook kind: {kind}")
+    rng = np.random.default_rng(seed)
+    workbook = Workbook(write_only=True)
+    for number in range(1, sheets + 1):
+        sheet = workbook.create_sheet(f"{kind.capitalize()} {number}")
+        for row in _rows(kind, rows, columns, rng):
+            sheet.append(row)
+    path = Path(path)
+    workbook.save(path)
+    return path
+
+
+def _rows(kind: str, rows: int, columns: int, rng: np.random.Generator) -> Iterator[List]:
+    if kind == 'estimate':
+        headers = ['Description', 'Quantity', 'Unit Price', 'Total']
+    elif kind == 'financial':
+        headers = ['Item', 'Amount']
+    else:
+        headers = ['Project', 'Hours', 'Rate', 'Variance']
+    extra = max(0, columns - len(headers))
+    yield (headers + [f"Note {n}" for n in range(1, extra + 1)])[:max(columns, 1)]
+
+    names = rng.integers(0, 1000, rows)
+    numbers = rng.integers(1, 500, (rows, 2))
+    filler = rng.integers(0, len(FILLER_WORDS), (rows, extra))
+    for i in range(rows):
+        if kind == 'estimate':
+            quantity, unit_price = int(numbers[i, 0]), round(float(numbers[i, 1]) * 1.25, 2)
+            row = [f"{ESTIMATE_ITEMS[names[i] % len(ESTIMATE_ITEMS)]} {i + 1}", quantity, unit_price,
+                   round(quantity * unit_price, 2)]
+        elif kind == 'financial':
+            if i % SECTION_ROWS == 0:
+                row = [f"Section {i // SECTION_ROWS + 1}", None]
+            else:
+                row = [FINANCIAL_ITEMS[names[i] % len(FINANCIAL_ITEMS)], int(numbers[i, 0]) * 100 - 25000]
+        else:
+            hours, rate = int(numbers[i, 0]), int(numbers[i, 1])
+            row = [f"{MIXED_ITEMS[names[i] % len(MIXED_ITEMS)]} {i + 1}", hours, rate, hours - rate]
+        yield (row + [FILLER_WORDS[word] for word in filler[i]])[:max(columns, 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('kind', choices=KINDS)
+    parser.add_argument('output', type=Path)
+    parser.add_argument('--rows', type=int, default=1000, help="data rows per sheet")
+    parser.add_argument('--columns', type=int, default=10)
+    parser.add_argument('--sheets', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    write_workbook(args.output, args.kind, args.rows, args.columns, args.sheets, args.seed)
+    print(f"Wrote {args.output}: {args.sheets} x {args.rows} x {args.columns} "
+          f"({args.sheets * args.rows * args.columns} cells)")
+
+
+if __name__ == "__main__":
+    main()